@@ -0,0 +1,172 @@
+import argparse, os, random, sys, types
+from collections import deque
+
+# netzero runs on microPython, provide the few builtins it needs on the host
+if 'micropython' not in sys.modules:
+    micropython = types.ModuleType('micropython')
+    micropython.const = lambda x: x
+    sys.modules['micropython'] = micropython
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from backend.core.singletons import Singletons
+import backend.modules.netzero as netzero_module
+
+class QuietLogger:
+    def create_logger(self, sender):
+        return self
+
+    def info(self, *msg):
+        pass
+
+    def error(self, *msg):
+        print('[error] ', *msg, sep='')
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class SimulatedInverter:
+    def __init__(self, max_power, latency):
+        self.max_power = max_power
+        self.latency = latency
+        self.power = 0
+        self.commands = 0
+        self.__pending = None
+
+    def command(self, now, power):
+        power = max(0, min(self.max_power, power))
+        # like the drivers, do not resend a power that is already requested
+        if (self.__pending is None and power == self.power) or (self.__pending is not None and power == self.__pending[1]):
+            return
+        self.commands += 1
+        self.__pending = (now + self.latency, power)
+
+    def tick(self, now):
+        if self.__pending is not None and self.__pending[0] <= now:
+            self.power = self.__pending[1]
+            self.__pending = None
+
+def load_profile(path):
+    profile = []
+    with open(path, 'r') as file:
+        for line in file:
+            try:
+                seconds, power = line.split(';')
+                profile.append((int(seconds.strip()), int(power.strip())))
+            except ValueError:
+                continue
+    # expand to one value per second, holding the last value
+    expanded = []
+    for index, (seconds, power) in enumerate(profile):
+        end = profile[index + 1][0] if index + 1 < len(profile) else seconds + 1
+        expanded.extend([power] * max(0, end - seconds))
+    return expanded
+
+def synthetic_profile(duration, seed):
+    rng = random.Random(seed)
+    profile = []
+    base = 250
+    while len(profile) < duration:
+        base = max(80, min(900, base + rng.choice((-300, -150, 0, 150, 300))))
+        spike = rng.choice((0, 0, 0, 1500)) # kettle, microwave, ...
+        for _ in range(rng.randint(60, 600)):
+            profile.append(base + spike + rng.randint(-15, 15))
+    return profile[:duration]
+
+def simulate(profile, config, max_power, latency, hold):
+    clock = Clock()
+    netzero_module.time = clock
+    netzero = netzero_module.NetZero(config)
+    inverter = SimulatedInverter(max_power, latency)
+    target = int(config['target'])
+    hysteresis = int(config['hysteresis'])
+    unsigned = not bool(config['signed'])
+
+    last_power = 0
+    feed_in = 0.0
+    step_start = None
+    settling_times = []
+    recent = deque(maxlen=hold)
+
+    for now, load in enumerate(profile):
+        clock.now = now
+        inverter.tick(now)
+        consumption = load - inverter.power
+        feed_in += max(0, -consumption) / 3600
+        measured = max(0, consumption) if unsigned else consumption
+
+        # mirrors Inverter.__on_live_consumption and Inverter._update_netzero
+        netzero.update(now, measured, last_power)
+        if inverter.power != last_power:
+            netzero.on_power_change()
+            last_power = inverter.power
+        delta = netzero.evaluate(last_power)
+        if delta != 0:
+            inverter.command(now, last_power + delta)
+
+        if now > 0 and abs(load - profile[now - 1]) > 2 * hysteresis:
+            if step_start is not None:
+                settling_times.append(now - step_start)
+            step_start = now
+        recent.append(consumption)
+        if step_start is not None and len(recent) == hold:
+            # netzero regulates the lower envelope of the consumption, so does the settling criterion
+            lowest = min(recent)
+            if abs(lowest - target) <= hysteresis \
+                    or (inverter.power == max_power and lowest > target) \
+                    or (inverter.power == 0 and lowest < target):
+                settling_times.append(max(0, now - hold + 1 - step_start))
+                step_start = None
+
+    return {
+        'settling time mean [s]': sum(settling_times) / len(settling_times) if settling_times else 0,
+        'settling time max [s]': max(settling_times, default=0),
+        'grid feed-in [Wh]': feed_in,
+        'inverter commands': inverter.commands
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the netzero algorithm against load profiles.")
+    parser.add_argument("profiles", nargs='*', help="Load profiles, one 'seconds;watts' pair per line.")
+    parser.add_argument("--duration", type=int, default=6 * 3600, help="Duration of the synthetic profile in s, used if no profile is given.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic profile.")
+    parser.add_argument("--max-power", type=int, default=800, help="Maximum inverter power in W.")
+    parser.add_argument("--latency", type=int, default=10, help="Time from inverter command to applied power in s.")
+    parser.add_argument("--hold", type=int, default=10, help="Time consumption must stay in target band to count as settled in s.")
+    parser.add_argument("--signed", action='store_true', help="Power meter measures feed-in as negative values.")
+    parser.add_argument("--target", type=int, default=50)
+    parser.add_argument("--hysteresis", type=int, default=20)
+    parser.add_argument("--change-upwards", type=int, default=100)
+    parser.add_argument("--change-downwards", type=int, default=400)
+    parser.add_argument("--kp", type=float, default=1.0)
+    parser.add_argument("--ki", type=float, default=0.0)
+    args = parser.parse_args()
+
+    Singletons.log = QuietLogger()
+
+    if args.profiles:
+        profiles = {os.path.basename(x): load_profile(x) for x in args.profiles}
+    else:
+        profiles = {'synthetic': synthetic_profile(args.duration, args.seed)}
+
+    base_config = {
+        'signed': args.signed,
+        'evaluated_time_span': 30,
+        'maturity_time_span': 15,
+        'target': args.target,
+        'hysteresis': args.hysteresis,
+        'change_upwards': args.change_upwards,
+        'change_downwards': args.change_downwards,
+        'kp': args.kp,
+        'ki': args.ki
+    }
+
+    for name, profile in profiles.items():
+        print(f'Profile {name}: {len(profile)} s')
+        for mode, extra in (('stepped', {}), ('regulator', {'change_upwards': args.max_power, 'change_downwards': args.max_power})):
+            config = dict(base_config, mode=mode, **extra)
+            result = simulate(profile, config, args.max_power, args.latency, args.hold)
+            print(f'  {mode:<10} ' + ' | '.join(f'{key}: {value:.1f}' for key, value in result.items()))
@@ -1,18 +1,23 @@
-from asyncio import sleep_ms, Lock
+from asyncio import sleep_ms
+from micropython import const
 from machine import UART
 from rp2 import StateMachine
 from struct import pack, pack_into
 from ubinascii import hexlify
 
-from .rs485tools import init_rs485
+from .busscheduler import BusScheduler, PRIORITY_WRITE, PRIORITY_TELEMETRY
+from .rs485tools import init_rs485, get_frame_gap_ms, receive
+from ..helpers.crc16 import crc16
+
+_BUFFER_SIZE = const(256)
+_RX_TIMEOUT = const(1100)
 
 class AddOnModbus:
     def __init__(self, port_id: int, baud, bits, parity, stop):
         from .singletons import Singletons
         self.__log = Singletons.log.create_logger(f'modbus{port_id}')
         self.__ui = Singletons.ui
-        self.__external_lock = Lock()
-        self.__internal_lock = Lock()
+        self.__scheduler = BusScheduler(self.__log, f'modbus{port_id}')
 
         assert bits == 8
         parity_bytes = 1 if parity is not None else 0
@@ -26,69 +31,80 @@ class AddOnModbus:
 
         self.__settings = (baud, bits, parity, stop)
 
-    @property
-    def lock(self):
-        return self.__external_lock
+        self.__frame_gap_ms = get_frame_gap_ms(self.__byte_time_us)
+
+        self.__tx = bytearray(_BUFFER_SIZE)
+        self.__tx_view = memoryview(self.__tx)
+        self.__rx = bytearray(_BUFFER_SIZE)
+        self.__rx_view = memoryview(self.__rx)
 
     def is_compatible(self, baud, bits, parity, stop):
         settings = (baud, bits, parity, stop)
         return settings == self.__settings
     
-    async def read_holding(self, address, register, count):
-        async with self.__internal_lock:
-            tx = bytearray(8)
-            pack_into('!BBHH', tx, 0, address, 3, register, count)
-            rx = await self.__query(tx)
-            if rx is None or not self.__check_input_packet(7, rx):
-                return None
-            return rx[3:-2]
+    async def read_holding(self, address, register, count, priority=PRIORITY_TELEMETRY):
+        # results are views into the receive buffer, valid until the next request on this port
+        return await self.__read(address, 3, register, count, priority)
     
-    async def read_input(self, address, register, count):
-        async with self.__internal_lock:
-            tx = bytearray(8)
-            pack_into('!BBHH', tx, 0, address, 4, register, count)
-            rx = await self.__query(tx)
-            if rx is None or not self.__check_input_packet(7, rx):
-                return None
-            return rx[3:-2]
+    async def read_input(self, address, register, count, priority=PRIORITY_TELEMETRY):
+        return await self.__read(address, 4, register, count, priority)
     
-    async def write_single(self, address, register, data):
-        async with self.__internal_lock:
+    async def write_single(self, address, register, data, priority=PRIORITY_WRITE):
+        await self.__scheduler.acquire(address, priority)
+        try:
             self.__ui.notify_control()
-            tx = bytearray(8)
-            pack_into('!BBHH', tx, 0, address, 6, register, data)
-            rx = await self.__query(tx)
+            pack_into('!BBHH', self.__tx, 0, address, 6, register, data)
+            rx = await self.__query(6)
             if rx is None or not self.__check_input_packet(8, rx):
                 return None
             return rx[4:-2]
+        finally:
+            self.__scheduler.release()
         
-    async def write_multi(self, address, register, data):
-        async with self.__internal_lock:
+    async def write_multi(self, address, register, data, priority=PRIORITY_WRITE):
+        await self.__scheduler.acquire(address, priority)
+        try:
             self.__ui.notify_control()
             payload_length = 2 * len(data)
-            tx = bytearray(9 + payload_length)
-            pack_into('!BBHHB', tx, 0, address, 0x10, register, len(data), payload_length)
+            pack_into('!BBHHB', self.__tx, 0, address, 0x10, register, len(data), payload_length)
             index = 7
             for word in data:
-                pack_into('!H', tx, index, word)
+                pack_into('!H', self.__tx, index, word)
                 index += 2
-            rx = await self.__query(tx)
+            rx = await self.__query(index)
             if rx is None or not self.__check_input_packet(8, rx):
                 return None
             return bytearray()
+        finally:
+            self.__scheduler.release()
         
-    async def send_custom(self, packet):
-        async with self.__internal_lock:
+    async def send_custom(self, packet, priority=PRIORITY_WRITE):
+        await self.__scheduler.acquire(packet[0], priority)
+        try:
             self.__ui.notify_control()
-            tx = packet + bytearray(2)
-            rx = await self.__query(tx)
+            self.__tx[:len(packet)] = packet
+            rx = await self.__query(len(packet))
             if rx is None or not self.__check_input_packet(4, rx):
                 return None
             return rx
+        finally:
+            self.__scheduler.release()
 
-    async def __query(self, packet):
+    async def __read(self, address, function, register, count, priority):
+        await self.__scheduler.acquire(address, priority)
+        try:
+            pack_into('!BBHH', self.__tx, 0, address, function, register, count)
+            rx = await self.__query(6)
+            if rx is None or not self.__check_input_packet(7, rx):
+                return None
+            return rx[3:-2]
+        finally:
+            self.__scheduler.release()
+
+    async def __query(self, length):
         # TX
-        packet[-2:] = self.__get_crc(packet, len(packet) - 2)
+        pack_into('<H', self.__tx, length, crc16(self.__tx, length))
+        packet = self.__tx_view[:length + 2]
         self.__log.info(f'TX {hexlify(packet)}')
 
         self.__sm.active(1)
@@ -97,43 +113,25 @@ class AddOnModbus:
 
         # RX
         await sleep_ms(round(self.__byte_time_us * len(packet) / 1000 + 1)) # wait roughly the send time to get an more exact RX timeout
-        for _ in range(11):
-            await sleep_ms(100)
-            if self.__uart.any():
-                break
+        count = await receive(self.__uart, self.__rx_view, self.__byte_time_us, _RX_TIMEOUT)
         self.__sm.active(0)
-        bytes = self.__uart.read(256)
-        await sleep_ms(round(self.__byte_time_us * 3.5 / 1000)) # minimum frame gap from modbus RTU spec
-        if bytes is None:
+        await sleep_ms(self.__frame_gap_ms) # minimum frame gap from modbus RTU spec
+        if not count:
             self.__log.error('No answer received')
             return None
-        self.__log.info(f'RX {hexlify(bytes)}')
-        return bytes
-
-    def __get_crc(self, bytes, length):
-        crc = 0xFFFF
-        for i in range(length):
-            crc = self.__add_byte_to_crc(crc, bytes[i])
-        return pack('<H', crc)
+        rx = self.__rx_view[:count]
+        self.__log.info(f'RX {hexlify(rx)}')
+        return rx
     
     def __check_input_packet(self, min_length, buffer):
-        if len(buffer) < min_length:
+        length = len(buffer)
+        if length < min_length:
             self.__log.error('Invalid packet ', hexlify(buffer), ': too short')
             return False
-        expected_crc = self.__get_crc(buffer, len(buffer) - 2)
-        received_crc = buffer[-2:]
+        expected_crc = crc16(buffer, length - 2)
+        received_crc = buffer[length - 2] | (buffer[length - 1] << 8)
         if received_crc != expected_crc:
-            self.__log.error('Invalid packet: wrong CRC; expected=', hexlify(expected_crc), ' received=', hexlify(received_crc))
+            self.__log.error('Invalid packet: wrong CRC; expected=', hexlify(pack('<H', expected_crc)), \
+                             ' received=', hexlify(buffer[length - 2:]))
             return False
         return True
-
-    @micropython.viper
-    def __add_byte_to_crc(self, crc: int, byte: int) -> int:
-        crc ^= byte
-        for i in range(8):
-            if crc & 1:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-        return crc
@@ -1,17 +1,21 @@
-from asyncio import sleep_ms, Lock
+from asyncio import sleep_ms
+from micropython import const
 from machine import UART
 from rp2 import StateMachine, DMA
 from ubinascii import hexlify
 
-from .rs485tools import init_rs485, start_dma
+from .busscheduler import BusScheduler, PRIORITY_TELEMETRY
+from .rs485tools import init_rs485, start_dma, get_frame_gap_ms, receive
+
+_BUFFER_SIZE = const(256)
+_RX_TIMEOUT = const(1100)
 
 class AddOnRs485:
     def __init__(self, port_id: int, baud, bits, parity, stop):
         from .singletons import Singletons
         self.__log = Singletons.log.create_logger(f'rs485_{port_id}')
 
-        self.__external_lock = Lock()
-        self.__internal_lock = Lock()
+        self.__scheduler = BusScheduler(self.__log, f'rs485_{port_id}')
 
         assert bits == 8
         parity_bytes = 1 if parity is not None else 0
@@ -26,39 +30,35 @@ class AddOnRs485:
 
         self.__settings = (baud, bits, parity, stop)
 
-    @property
-    def lock(self):
-        return self.__external_lock
+        self.__frame_gap_ms = get_frame_gap_ms(self.__byte_time_us)
+        self.__rx_view = memoryview(bytearray(_BUFFER_SIZE))
 
     def is_compatible(self, baud, bits, parity, stop):
         settings = (baud, bits, parity, stop)
         return settings == self.__settings
 
-    async def send(self, data):
-        async with self.__internal_lock:
-            try:
-                # TX
-                self.__log.info(f'TX {hexlify(data)}')
+    async def send(self, data, device=None, priority=PRIORITY_TELEMETRY):
+        await self.__scheduler.acquire(device, priority)
+        try:
+            # TX
+            self.__log.info(f'TX {hexlify(data)}')
 
-                self.__sm.active(1)
-                self.__sm.restart()
-                dma = start_dma(self.__port_id, self.__sm, data)
-            
-                # RX
-                await sleep_ms(round(self.__byte_time_us * len(data) / 1000 + 1)) # wait roughly the send time to get an more exact RX timeout
-                for _ in range(11):
-                    await sleep_ms(100)
-                    if self.__uart.any():
-                        break
-                self.__sm.active(0)
-                dma.active(False)
-                dma.close()
-                bytes = self.__uart.read(256)
-                await sleep_ms(round(self.__byte_time_us * 3.5 / 1000)) # minimum frame gap from modbus RTU spec
-                if bytes is None:
-                    self.__log.error('No answer received')
-                    return None
-                self.__log.info(f'RX {hexlify(bytes)}')
-                return bytes
-            finally:
-                await sleep_ms(500)
+            self.__sm.active(1)
+            self.__sm.restart()
+            dma = start_dma(self.__port_id, self.__sm, data)
+        
+            # RX
+            await sleep_ms(round(self.__byte_time_us * len(data) / 1000 + 1)) # wait roughly the send time to get an more exact RX timeout
+            count = await receive(self.__uart, self.__rx_view, self.__byte_time_us, _RX_TIMEOUT)
+            self.__sm.active(0)
+            dma.active(False)
+            dma.close()
+            if count == 0:
+                self.__log.error('No answer received')
+                return None
+            rx = bytes(self.__rx_view[:count])
+            self.__log.info(f'RX {hexlify(rx)}')
+            return rx
+        finally:
+            await sleep_ms(self.__frame_gap_ms) # minimum frame gap between transactions
+            self.__scheduler.release()
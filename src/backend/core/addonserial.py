@@ -1,8 +1,12 @@
-from asyncio import create_task, sleep
+from asyncio import create_task, sleep_ms
 from machine import Pin, UART
+from micropython import const
 
 from .types import run_callbacks
 
+_BUFFER_SIZE = const(512)
+_POLL_INTERVAL = const(10) # ms, the uart fifo holds 256 bytes, so this is sufficient up to more than 115200 baud
+
 class AddOnSerial:
     def __init__(self, port_id: int):
         if port_id == 0:
@@ -17,6 +21,12 @@ class AddOnSerial:
         self.__rx_task = None
         self.__on_rx = list()
 
+        # received data is kept in [__start:__end], complete lines are handed out as views into the buffer
+        self.__buffer = bytearray(_BUFFER_SIZE)
+        self.__view = memoryview(self.__buffer)
+        self.__start = 0
+        self.__end = 0
+
     def set_mode(self, line: bool):
         self.__line_mode = line
 
@@ -26,23 +36,45 @@ class AddOnSerial:
         self.__rx_task = create_task(self.__receive())
 
     def send(self, buffer):
-        print(buffer)
-        bytes = self.__uart.write(buffer)
-        print(bytes, ' Bytes sent')
+        self.__uart.write(buffer)
 
     async def __receive(self):
+        # views passed to the callbacks are only valid during the callback
         while self.__connected:
-            while True:
-                if self.__uart.any() > 0:
-                    if self.__line_mode:
-                        bytes = self.__uart.readline()
+            while self.__uart.any() > 0:
+                if self.__end == _BUFFER_SIZE:
+                    if self.__start == 0:
+                        self.__end = 0 # line longer than the buffer, drop it
                     else:
-                        bytes = self.__uart.read(64)
-                    if bytes is not None and len(bytes) > 0:
-                        run_callbacks(self.on_rx, bytes)
-                else:
+                        self.__compact()
+                count = self.__uart.readinto(self.__view[self.__end:], _BUFFER_SIZE - self.__end)
+                if not count:
                     break
-            await sleep(0.1)
+                if self.__line_mode:
+                    self.__end += count
+                    self.__split_lines(self.__end - count)
+                else:
+                    run_callbacks(self.__on_rx, self.__view[:count])
+            await sleep_ms(_POLL_INTERVAL)
+
+    def __split_lines(self, begin: int):
+        buffer = self.__buffer
+        for i in range(begin, self.__end):
+            if buffer[i] == 10: # newline
+                run_callbacks(self.__on_rx, self.__view[self.__start:i + 1])
+                self.__start = i + 1
+        if self.__start == self.__end:
+            self.__start = 0
+            self.__end = 0
+
+    def __compact(self):
+        # the remainder is at most one partial line, so moving it byte by byte is cheap
+        buffer = self.__buffer
+        length = self.__end - self.__start
+        for i in range(length):
+            buffer[i] = buffer[self.__start + i]
+        self.__start = 0
+        self.__end = length
 
     @property
     def on_rx(self):
@@ -47,6 +47,8 @@ class Mqtt():
 
         self.__sen_dev = 'sen/dev/%s'
 
+        self.__ble_stat = 'ble/stat'
+
         self.__connect_callback = list()
         self.__mode_callback = list()
 
@@ -127,6 +129,12 @@ class Mqtt():
         payload = dumps(data).encode('utf-8')
         await self.__mqtt.publish(self.__sen_dev % name, payload, qos=2, retain=False)
 
+# bluetooth
+
+    async def send_bluetooth_statistics(self, data: dict):
+        payload = dumps(data).encode('utf-8')
+        await self.__mqtt.publish(self.__ble_stat, payload, qos=0, retain=False)
+
 # other
 
     @property
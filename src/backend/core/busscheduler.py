@@ -0,0 +1,97 @@
+from asyncio import Event
+from micropython import const
+from time import ticks_ms, ticks_diff
+
+PRIORITY_WRITE = const(0)
+PRIORITY_CONTROL = const(1)
+PRIORITY_TELEMETRY = const(2)
+
+_DEADLINES = (1000, 3000, 10000) # ms per priority, overdue transactions are served like writes
+
+class BusScheduler:
+    # Grants a shared bus to one transaction at a time.
+    # Waiting transactions are ordered by priority, then by the bus time their device already used in the
+    # current statistics period, so a chatty device can not starve others of the same priority.
+    def __init__(self, log, name: str):
+        self.__log = log
+        self.__busy = False
+        self.__device = None
+        self.__granted = 0
+        self.__waiting = []
+        self.__device_ms = {}
+        self.__busy_ms = 0
+        self.__counts = [0, 0, 0]
+        self.__max_wait_ms = [0, 0, 0]
+        self.__period_start = ticks_ms()
+
+        from .triggers import triggers
+        triggers.add_subscriber(self.__on_trigger, interval=60, name=name)
+
+    async def acquire(self, device, priority: int):
+        now = ticks_ms()
+        if not self.__busy and not self.__waiting:
+            self.__grant(device, priority, now)
+            return
+        request = [priority, device, now, Event()]
+        self.__waiting.append(request)
+        try:
+            await request[3].wait()
+        except BaseException:
+            if request in self.__waiting:
+                self.__waiting.remove(request)
+            elif self.__device is device:
+                self.release()
+            raise
+
+    def release(self):
+        now = ticks_ms()
+        duration = ticks_diff(now, self.__granted)
+        self.__busy_ms += duration
+        self.__device_ms[self.__device] = self.__device_ms.get(self.__device, 0) + duration
+        self.__busy = False
+        self.__device = None
+        if not self.__waiting:
+            return
+        request = self.__next(now)
+        self.__waiting.remove(request)
+        self.__grant(request[1], request[0], request[2])
+        request[3].set()
+
+    def __grant(self, device, priority: int, enqueued: int):
+        now = ticks_ms()
+        self.__busy = True
+        self.__device = device
+        self.__granted = now
+        self.__counts[priority] += 1
+        self.__max_wait_ms[priority] = max(self.__max_wait_ms[priority], ticks_diff(now, enqueued))
+
+    def __next(self, now: int):
+        best = None
+        best_key = None
+        for request in self.__waiting:
+            priority, device, enqueued, _ = request
+            waited = ticks_diff(now, enqueued)
+            if waited > _DEADLINES[priority]:
+                priority = PRIORITY_WRITE
+            key = (priority, self.__device_ms.get(device, 0), -waited)
+            if best_key is None or key < best_key:
+                best = request
+                best_key = key
+        return best
+
+    def __on_trigger(self, trigger_type):
+        from .triggers import TRIGGER_300S
+        if trigger_type != TRIGGER_300S:
+            return
+        now = ticks_ms()
+        period = max(1, ticks_diff(now, self.__period_start))
+        self.__log.info('Bus utilisation=', self.__busy_ms * 100 // period, ' % | transactions write/control/telemetry=', \
+                        self.__counts[0], '/', self.__counts[1], '/', self.__counts[2], ' | max wait=', \
+                        self.__max_wait_ms[0], '/', self.__max_wait_ms[1], '/', self.__max_wait_ms[2], ' ms')
+        for device, duration in self.__device_ms.items():
+            self.__log.info('Device ', device, ': ', duration, ' ms bus time')
+        self.__period_start = now
+        self.__busy_ms = 0
+        self.__device_ms.clear()
+        self.__counts = [0, 0, 0]
+        self.__max_wait_ms = [0, 0, 0]
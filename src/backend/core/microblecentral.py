@@ -1,9 +1,13 @@
-from asyncio import Event, sleep
+from asyncio import Event, ThreadSafeFlag, TimeoutError, wait_for_ms
 from bluetooth import BLE
 from bluetooth import UUID as BT_UUID
 from micropython import const
+from struct import pack, unpack_from
+from time import ticks_ms, ticks_add, ticks_diff
 from ubinascii import hexlify, unhexlify
 
+from .types import run_callbacks
+
 _IRQ_PERIPHERAL_CONNECT = const(7)
 _IRQ_PERIPHERAL_DISCONNECT = const(8)
 _IRQ_GATTC_SERVICE_RESULT = const(9)
@@ -21,6 +25,14 @@ _IRQ_CONNECTION_UPDATE = const(27)
 
 _BLUETOOTH_LOG_NAME = const('bluetooth')
 
+TRANSPORT_BLUETOOTH = const('bluetooth')
+
+_CACHE_PATH = const('/ble_cache.bin')
+
+_MIN_CONNECT_TIMEOUT = const(3000)
+_BACKOFF_BASE = const(5000)
+_BACKOFF_MAX = const(300000)
+
 
 class MicroBleAlreadyConnectedError(Exception):
     def __str__(self):
@@ -55,23 +67,78 @@ class MicroBleDevice:
         self.__mtu = None
         self.__address = None
         self.__address_type = None
+        self.__printable_address = None
         self.__handle = None
 
-        self.__services = []
+        self.__services = [] # discovered services, characteristics and descriptors are kept across reconnects
+        self.__validated = True
+        central.__devices.append(self)
+
+        # arbitration of the central and statistics
+        self.__grant = Event()
+        self.__acquired = 0
+        self.__failures = 0
+        self.__backoff_until = None
+        self.__connect_ms = None
+        self.radio_ms = 0
+        self.attempts = 0
+        self.successes = 0
+
+        # completion flags, set from the irq handler
+        self.__connect_event = ThreadSafeFlag()
+        self.__mtu_event = ThreadSafeFlag()
+        self.__disconnect_event = ThreadSafeFlag()
+        self.__service_event = ThreadSafeFlag()
+        self.__characteristics_event = ThreadSafeFlag()
+        self.__descriptors_event = ThreadSafeFlag()
+        self.__read_event = ThreadSafeFlag()
+        self.__read_status = None
+        self.__write_event = ThreadSafeFlag()
+
+    @property
+    def connected(self):
+        return self.__handle is not None
+
+    @property
+    def session(self):
+        # with only one device, there is no need to release the central, so the connection is kept between reads
+        return len(self.__central.__devices) == 1
+
+    async def acquire(self):
+        # waits until the central is free, returns False while the device is backed off after failures
+        if self.__backoff_until is not None and ticks_diff(self.__backoff_until, ticks_ms()) > 0:
+            return False
+        await self.__central.__acquire(self)
+        self.__acquired = ticks_ms()
+        self.attempts += 1
+        return True
 
-        self.__service_event = Event()
-        self.__characteristics_event = Event()
-        self.__descriptors_event = Event()
-        self.__read_event = Event()
-        self.__write_event = Event()
+    def release(self, success: bool):
+        self.radio_ms += ticks_diff(ticks_ms(), self.__acquired)
+        if success:
+            self.successes += 1
+            self.__failures = 0
+            self.__backoff_until = None
+        else:
+            self.__failures += 1
+            backoff = min(_BACKOFF_BASE << min(self.__failures - 1, 16), _BACKOFF_MAX)
+            self.__backoff_until = ticks_add(ticks_ms(), backoff)
+            self.__log.info('Backing off ', self.__printable_address, ' for ', backoff, ' ms after ', self.__failures, ' failures')
+        self.__central.__release(self)
 
     async def connect(self, mac, address_type, timeout = 5000):
         self.__printable_address = mac
         self.__address = unhexlify(mac.replace(':', ''))
         self.__address_type = address_type
 
+        if not self.__services:
+            self.__restore()
+
         await self.reconnect(timeout)
 
+        if not self.__validated:
+            await self.__validate(timeout)
+
     async def reconnect(self, timeout = 5000):
         if self.__central.__current_device is not None:
             raise MicroBleAlreadyConnectedError()
@@ -81,24 +148,26 @@ class MicroBleDevice:
             self.__mtu = None
             self.__central.__current_device = self
             self.__log.info('Connecting to ', self.__printable_address)
+            # learned from past connects, a failed connect falls back to the full timeout
+            connect_timeout = timeout if self.__connect_ms is None \
+                else min(timeout, max(_MIN_CONNECT_TIMEOUT, 3 * self.__connect_ms))
+            start = ticks_ms()
+            self.__connect_event.clear()
             self.__ble.gap_connect(self.__address_type, self.__address)
             self.__ui.notify_bluetooth()
-            for _ in range (timeout // 100):
-                if self.__handle is not None:
-                    break
-                await sleep(0.1)
-            else:
+            try:
+                await self.__wait(self.__connect_event, connect_timeout, 'connect')
+            except MicroBleTimeoutError:
                 self.__ble.gap_connect(None)
-                raise MicroBleTimeoutError('connect')
+                self.__connect_ms = None
+                raise
+            duration = ticks_diff(ticks_ms(), start)
+            self.__connect_ms = duration if self.__connect_ms is None else (3 * self.__connect_ms + duration) // 4
 
+            self.__mtu_event.clear()
             self.__ble.gattc_exchange_mtu(self.__handle)
             self.__ui.notify_bluetooth()
-            for _ in range (timeout // 100):
-                if self.__mtu is not None:
-                    break
-                await sleep(0.1)
-            else:
-                raise MicroBleTimeoutError('mtu exchange')
+            await self.__wait(self.__mtu_event, timeout, 'mtu exchange')
         except AttributeError:
             if self.__central.__current_device is None:
                 raise MicroBleConnectionClosedError()
@@ -112,12 +181,12 @@ class MicroBleDevice:
         try:
             if self.__handle is None:
                 return
+            self.__disconnect_event.clear()
             self.__ble.gap_disconnect(self.__handle)
             self.__ui.notify_bluetooth()
-            for _ in range (timeout // 100):
-                if self.__central.__current_device is None and self.__handle is None:
-                    return
-                await sleep(0.1)
+            await wait_for_ms(self.__disconnect_event.wait(), timeout)
+        except TimeoutError:
+            pass
         finally:
             # Even if device did not respond, there is nothing we can do, so mark as disconnected
             self.__log.info('Disconnected from ', self.__printable_address)
@@ -131,13 +200,82 @@ class MicroBleDevice:
             return result
         self.__service_event.clear()
         self.__ble.gattc_discover_services(self.__handle, uuid)
-        for _ in range (timeout // 100):
-            await sleep(0.1)
-            if self.__service_event.is_set():
-                result = self.__get_service_by_uuid(uuid)
-                if result is not None:
-                    return result
-        raise MicroBleTimeoutError('service read')
+        await self.__wait(self.__service_event, timeout, 'service read')
+        result = self.__get_service_by_uuid(uuid)
+        if result is None:
+            raise MicroBleTimeoutError('service read')
+        self.__store()
+        return result
+
+    async def __wait(self, event, timeout, action):
+        try:
+            await wait_for_ms(event.wait(), timeout)
+        except TimeoutError:
+            raise MicroBleTimeoutError(action)
+
+    def __store(self):
+        # layout: services (uuid length, uuid, start handle, end handle, characteristic count)
+        # each followed by its characteristics (uuid length, uuid, value handle, end handle, descriptor handle or 0)
+        blob = bytearray()
+        for service in self.__services:
+            uuid = bytes(service.uuid)
+            blob += pack('<B', len(uuid)) + uuid + pack('<HHB', service.start_handle, service.end_handle, len(service.__characteristics))
+            for characteristic in service.__characteristics:
+                uuid = bytes(characteristic.uuid)
+                descriptor = characteristic.__descriptor.handle if characteristic.__descriptor is not None else 0
+                blob += pack('<B', len(uuid)) + uuid + pack('<HHH', characteristic.value_handle, characteristic.end_handle, descriptor)
+        self.__central.__store_cache(self.__address, bytes(blob))
+
+    def __restore(self):
+        blob = self.__central.__cache.get(self.__address, None)
+        if blob is None:
+            return
+        try:
+            index = 0
+            while index < len(blob):
+                uuid_length = blob[index]
+                uuid = BT_UUID(blob[index + 1:index + 1 + uuid_length])
+                index += 1 + uuid_length
+                start_handle, end_handle, characteristics = unpack_from('<HHB', blob, index)
+                index += 5
+                service = MicroBleService(self, uuid, start_handle, end_handle)
+                for _ in range(characteristics):
+                    uuid_length = blob[index]
+                    uuid = BT_UUID(blob[index + 1:index + 1 + uuid_length])
+                    index += 1 + uuid_length
+                    value_handle, characteristic_end_handle, descriptor = unpack_from('<HHH', blob, index)
+                    index += 6
+                    characteristic = MicroBleCharacteristic(self, uuid, value_handle, characteristic_end_handle)
+                    if descriptor != 0:
+                        characteristic.__descriptor = MicroBleDescriptor(self, descriptor)
+                    service.__characteristics.append(characteristic)
+                self.__services.append(service)
+            self.__validated = False
+        except Exception as e:
+            self.__log.error('Invalid cache entry for ', self.__printable_address, ': ', e)
+            self.__services.clear()
+
+    async def __validate(self, timeout):
+        # reading the cached CCCDs is cheap compared to a discovery and fails if the handles changed
+        self.__validated = True
+        for service in self.__services:
+            for characteristic in service.__characteristics:
+                if characteristic.__descriptor is None:
+                    continue
+                try:
+                    await self.__read(characteristic.__descriptor.handle, timeout)
+                    valid = self.__read_status == 0
+                except (MicroBleTimeoutError, OSError):
+                    valid = False
+                if not valid:
+                    self.__central.cache_misses += 1
+                    self.__log.info('Cached handles of ', self.__printable_address, ' are outdated, hits=', \
+                                    self.__central.cache_hits, ' misses=', self.__central.cache_misses)
+                    self.__services.clear()
+                    return
+        self.__central.cache_hits += 1
+        self.__log.info('Cached handles of ', self.__printable_address, ' are valid, hits=', \
+                        self.__central.cache_hits, ' misses=', self.__central.cache_misses)
 
 
     def __get_service_by_uuid(self, uuid):
@@ -170,26 +308,15 @@ class MicroBleDevice:
         self.__ble.gattc_write(self.__handle, target_handle, data, 1 if is_request else 0)
         if not is_request:
             return
-        for _ in range (timeout // 100):
-            await sleep(0.1)
-            if self.__write_event.is_set():
-                break
-        else:
-            raise MicroBleTimeoutError('data write')
-        return
+        await self.__wait(self.__write_event, timeout, 'data write')
 
 
     async def __read(self, target_handle, timeout):
         self.__read_event.clear()
+        self.__read_status = None
         self.__ui.notify_bluetooth()
         self.__ble.gattc_read(self.__handle, target_handle)
-        for _ in range (timeout // 100):
-            await sleep(0.1)
-            if self.__read_event.is_set():
-                break
-        else:
-            raise MicroBleTimeoutError('data read')
-        return
+        await self.__wait(self.__read_event, timeout, 'data read')
 
 
 class MicroBleService:
@@ -208,13 +335,12 @@ class MicroBleService:
             return result
         self.__device.__characteristics_event.clear()
         self.__device.__ble.gattc_discover_characteristics(self.__device.__handle, self.start_handle, self.end_handle, uuid)
-        for _ in range (timeout // 100):
-            await sleep(0.1)
-            if self.__device.__characteristics_event.is_set():
-                result = self.__get_characteristic_by_uuid(uuid)
-                if result is not None:
-                    return result
-        raise MicroBleTimeoutError('characteristic read')
+        await self.__device.__wait(self.__device.__characteristics_event, timeout, 'characteristic read')
+        result = self.__get_characteristic_by_uuid(uuid)
+        if result is None:
+            raise MicroBleTimeoutError('characteristic read')
+        self.__device.__store()
+        return result
 
 
     def __get_characteristic_by_uuid(self, uuid):
@@ -257,12 +383,11 @@ class MicroBleCharacteristic:
             raise MicroBleNoDescriptorError()
         self.__device.__descriptors_event.clear()
         self.__device.__ble.gattc_discover_descriptors(self.__device.__handle, self.value_handle, self.end_handle)
-        for _ in range (timeout // 100):
-            await sleep(0.1)
-            if self.__device.__descriptors_event.is_set():
-                if self.__descriptor is not None:
-                    return self.__descriptor
-        raise MicroBleTimeoutError('descriptor read')
+        await self.__device.__wait(self.__device.__descriptors_event, timeout, 'descriptor read')
+        if self.__descriptor is None:
+            raise MicroBleTimeoutError('descriptor read')
+        self.__device.__store()
+        return self.__descriptor
 
     def __enqueue(self, data):
         if self.__rx_handler is not None:
@@ -288,6 +413,18 @@ class MicroBleCentral:
 
         self.__ble = BLE()
         self.__current_device = None
+        self.__devices = []
+
+        self.__cache = self.__load_cache()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.__owner = None
+        self.__waiting = []
+        self.__statistics_callbacks = []
+
+        from .triggers import triggers
+        triggers.add_subscriber(self.__on_trigger, interval=60, name=_BLUETOOTH_LOG_NAME)
     
     def activate(self):
         self.__ble.active(True)
@@ -296,6 +433,84 @@ class MicroBleCentral:
 
     def deactivate(self):
         self.__ble.active(False)
+
+    @property
+    def on_statistics_data(self):
+        return self.__statistics_callbacks
+
+    async def __acquire(self, device: MicroBleDevice):
+        # devices get the central in the order they asked for it
+        if self.__owner is None and not self.__waiting:
+            self.__owner = device
+            return
+        device.__grant.clear()
+        self.__waiting.append(device)
+        try:
+            await device.__grant.wait()
+        except BaseException:
+            if device in self.__waiting:
+                self.__waiting.remove(device)
+            self.__release(device)
+            raise
+
+    def __release(self, device: MicroBleDevice):
+        if self.__owner is not device:
+            return
+        self.__owner = None
+        if self.__waiting:
+            self.__owner = self.__waiting.pop(0)
+            self.__owner.__grant.set()
+
+    def __on_trigger(self, trigger_type):
+        from .triggers import TRIGGER_300S
+        if trigger_type != TRIGGER_300S:
+            return
+        data = {}
+        for device in self.__devices:
+            if device.attempts == 0:
+                continue
+            self.__log.info(device.__printable_address, ': ', device.successes, '/', device.attempts, ' reads ok | ', \
+                            device.radio_ms, ' ms radio time | ', device.__connect_ms, ' ms connect')
+            data[device.__printable_address] = {
+                'attempts': device.attempts,
+                'successes': device.successes,
+                'radio_ms': device.radio_ms,
+                'connect_ms': device.__connect_ms
+            }
+            device.attempts = 0
+            device.successes = 0
+            device.radio_ms = 0
+        if data:
+            run_callbacks(self.__statistics_callbacks, data)
+
+    def __load_cache(self):
+        # layout: per device 6 bytes address, 2 bytes length, device entry
+        cache = {}
+        try:
+            with open(_CACHE_PATH, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return cache
+        index = 0
+        while index + 8 <= len(data):
+            length = unpack_from('<H', data, index + 6)[0]
+            cache[bytes(data[index:index + 6])] = data[index + 8:index + 8 + length]
+            index += 8 + length
+        self.__log.info('Handle cache loaded, devices=', len(cache))
+        return cache
+
+    def __store_cache(self, address, blob):
+        if self.__cache.get(address, None) == blob:
+            return
+        self.__cache[address] = blob
+        try:
+            with open(_CACHE_PATH, 'wb') as file:
+                for cached_address, cached_blob in self.__cache.items():
+                    file.write(cached_address)
+                    file.write(pack('<H', len(cached_blob)))
+                    file.write(cached_blob)
+        except Exception as e:
+            self.__log.error('Failed to write handle cache: ', e)
             
     def __on_irq(self, event, data):
         self.__ui.notify_bluetooth()
@@ -311,19 +526,23 @@ class MicroBleCentral:
                     self.__ble.gap_disconnect(conn_handle)
                     return
                 self.__current_device.__handle = conn_handle
+                self.__current_device.__connect_event.set()
             elif event == _IRQ_PERIPHERAL_DISCONNECT:
                 conn_handle, _, _ = data
                 self.__log.info('Disconnect event, handle=', conn_handle)
                 if not self.__check_connection_handle(conn_handle):
                     return
-                self.__current_device.__handle = None
+                device = self.__current_device
+                device.__handle = None
                 self.__current_device = None
+                device.__disconnect_event.set()
             elif event == _IRQ_MTU_EXCHANGED:
                 conn_handle, mtu = data
                 self.__log.info('Mtu exchanged event, handle=', conn_handle, ' mtu=', mtu)
                 if not self.__check_connection_handle(conn_handle):
                     return
                 self.__current_device.__mtu = mtu
+                self.__current_device.__mtu_event.set()
             elif event == _IRQ_GATTC_SERVICE_RESULT:
                 conn_handle, start_handle, end_handle, uuid = data
                 self.__log.info('Service event, connection=', conn_handle, ' start=', start_handle, ' end=', end_handle, ' uuid=', uuid)
@@ -380,6 +599,7 @@ class MicroBleCentral:
                 self.__log.info('Read done event, connection=', conn_handle, ' characteristic=', value_handle, ' status=', status)
                 if not self.__check_connection_handle(conn_handle):
                     return
+                self.__current_device.__read_status = status
                 self.__current_device.__read_event.set()
             elif event == _IRQ_GATTC_WRITE_DONE:
                 conn_handle, value_handle, status = data
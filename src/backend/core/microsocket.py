@@ -51,6 +51,7 @@ class MicroSocket:
 
                 self.__socket.setblocking(False)
             else:
+                self.__socket.close() # release the socket of the failed connection attempt
                 raise MicroSocketClosedExecption()
 
         @property
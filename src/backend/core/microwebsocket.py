@@ -0,0 +1,162 @@
+from hashlib import sha1
+from micropython import const
+from os import urandom
+from struct import pack, unpack
+from time import ticks_ms, ticks_diff
+from ubinascii import b2a_base64
+
+from .microsocket import MicroSocket, MicroSocketClosedExecption, MicroSocketTimeoutException
+
+OPCODE_CONTINUATION = const(0x0)
+OPCODE_TEXT = const(0x1)
+OPCODE_BINARY = const(0x2)
+OPCODE_CLOSE = const(0x8)
+OPCODE_PING = const(0x9)
+OPCODE_PONG = const(0xA)
+
+_MAX_PAYLOAD = const(16384)
+_PING_INTERVAL = const(30000) # ms without any received data until a ping is sent
+_IDLE_TIMEOUT = const(60000) # ms without any received data until the connection is considered dead
+_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+class WebSocketClient:
+    # Minimal RFC 6455 client on top of MicroSocket, messages are received completely before they are returned.
+    def __init__(self, log, host, port, path, auth=None):
+        self.__log = log
+        self.__host = host
+        self.__port = port
+        self.__path = path
+        self.__auth = auth
+        self.__socket = None
+        self.__header = bytearray(8)
+        self.__last_rx = ticks_ms()
+        self.__ping_sent = False
+
+    @property
+    def is_connected(self):
+        return self.__socket is not None and self.__socket.is_connected
+
+    async def connect(self):
+        self.close()
+        self.__socket = MicroSocket(self.__log, self.__host, self.__port, None, None)
+        key = b2a_base64(urandom(16), newline=False)
+        await self.__socket.send(b'GET /%s HTTP/1.1\r\n' % self.__path)
+        await self.__socket.send(b'Host: %s\r\n' % self.__host)
+        await self.__socket.send(b'Upgrade: websocket\r\nConnection: Upgrade\r\n')
+        await self.__socket.send(b'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n' % key)
+        if self.__auth:
+            await self.__socket.send(self.__auth.header)
+        await self.__socket.send(b'\r\n')
+
+        line = (await self.__socket.receiveline()).split(None, 2)
+        if len(line) < 2 or int(line[1]) != 101:
+            raise ValueError('Websocket upgrade failed: %s' % line)
+        accept = None
+        while True:
+            line = await self.__socket.receiveline()
+            if not line or line == b'\r\n':
+                break
+            name, value = str(line, 'utf-8').split(':', 1)
+            if name.strip().lower() == 'sec-websocket-accept':
+                accept = value.strip()
+        if accept != b2a_base64(sha1(key + _GUID).digest(), newline=False).decode('ascii'):
+            raise ValueError('Websocket upgrade failed: invalid accept key')
+        self.__last_rx = ticks_ms()
+        self.__ping_sent = False
+
+    def close(self):
+        # the socket is closed even if it already flagged itself as disconnected, so it is always released
+        if self.__socket is not None:
+            self.__socket.close()
+        self.__socket = None
+
+    async def send(self, payload, opcode=OPCODE_TEXT):
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        await self.__send_frame(opcode, payload)
+
+    async def receive(self):
+        # returns (opcode, payload) of the next data message, control frames are handled here
+        message = None
+        message_opcode = None
+        while True:
+            fin, opcode, payload = await self.__receive_frame()
+            if opcode == OPCODE_PING:
+                await self.__send_frame(OPCODE_PONG, payload)
+            elif opcode == OPCODE_PONG:
+                pass
+            elif opcode == OPCODE_CLOSE:
+                try:
+                    await self.__send_frame(OPCODE_CLOSE, payload[:2]) # echo the status code
+                finally:
+                    self.close()
+                raise MicroSocketClosedExecption()
+            elif opcode == OPCODE_CONTINUATION:
+                if message is None:
+                    raise ValueError('Unexpected continuation frame')
+                message.extend(payload)
+                if len(message) > _MAX_PAYLOAD:
+                    raise ValueError('Websocket message too large')
+                if fin:
+                    return message_opcode, message
+            elif fin:
+                return opcode, payload
+            else:
+                message = payload
+                message_opcode = opcode
+
+    async def __receive_frame(self):
+        while True:
+            try:
+                first = (await self.__socket.receiveone())[0]
+                break
+            except MicroSocketTimeoutException:
+                # nothing received yet, keep the connection alive
+                idle = ticks_diff(ticks_ms(), self.__last_rx)
+                if idle > _IDLE_TIMEOUT:
+                    raise
+                if idle > _PING_INTERVAL and not self.__ping_sent:
+                    await self.__send_frame(OPCODE_PING, b'')
+                    self.__ping_sent = True
+        self.__last_rx = ticks_ms()
+        self.__ping_sent = False
+
+        header = self.__header
+        await self.__socket.receive_into(header, 0, 1)
+        masked = header[0] & 0x80
+        length = header[0] & 0x7F
+        if length == 126:
+            await self.__socket.receive_into(header, 0, 2)
+            length = unpack('!H', header[:2])[0]
+        elif length == 127:
+            await self.__socket.receive_into(header, 0, 8)
+            length = unpack('!Q', header)[0]
+        if length > _MAX_PAYLOAD:
+            raise ValueError('Websocket frame too large: %d' % length)
+        if masked: # servers must not mask, but be tolerant
+            await self.__socket.receive_into(header, 0, 4)
+        payload = bytearray(length)
+        if length:
+            await self.__socket.receive_into(payload, 0, length)
+        if masked:
+            for i in range(length):
+                payload[i] ^= header[i & 3]
+        return first & 0x80, first & 0x0F, payload
+
+    async def __send_frame(self, opcode: int, payload):
+        length = len(payload)
+        if length < 126:
+            header = pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 0x10000:
+            header = pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        # frames from clients are always masked
+        mask = urandom(4)
+        frame = bytearray(header)
+        frame.extend(mask)
+        frame.extend(payload)
+        offset = len(header) + 4
+        for i in range(length):
+            frame[offset + i] ^= mask[i & 3]
+        await self.__socket.send(frame)
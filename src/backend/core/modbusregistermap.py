@@ -0,0 +1,61 @@
+from micropython import const
+from .busscheduler import PRIORITY_TELEMETRY
+from ..helpers.streamreader import read_big_uint16, read_big_uint32
+
+FUNCTION_READ_HOLDING = const(3)
+FUNCTION_READ_INPUT = const(4)
+
+_MAX_GAP = const(48) # reading 48 unused registers at 9600 baud takes about as long as the overhead of one transaction
+_MAX_COUNT = const(125) # maximum register count of a single read
+
+class RegisterMap:
+    # Declarative set of registers read with one function code.
+    # Fields closer than max_gap registers are merged into one block read, so a full refresh needs as few
+    # transactions as possible. The values are kept in a buffer until the next read.
+    def __init__(self, function: int, fields: dict, max_gap: int = _MAX_GAP):
+        self.__function = function
+        self.__offsets = {}
+        self.__blocks = []
+
+        start = None
+        end = None
+        offset = 0
+        for name, (register, count) in sorted(fields.items(), key=lambda x: x[1][0]):
+            if start is not None and register - end <= max_gap and max(end, register + count) - start <= _MAX_COUNT:
+                end = max(end, register + count)
+            else:
+                if start is not None:
+                    self.__blocks.append((start, end - start, offset))
+                    offset += 2 * (end - start)
+                start = register
+                end = register + count
+            self.__offsets[name] = offset + 2 * (register - start)
+        if start is not None:
+            self.__blocks.append((start, end - start, offset))
+            offset += 2 * (end - start)
+
+        self.__buffer = bytearray(offset)
+
+    @property
+    def transactions(self):
+        return len(self.__blocks)
+
+    async def read(self, port, address: int, priority: int = PRIORITY_TELEMETRY):
+        # returns False if any block could not be read
+        read = port.read_holding if self.__function == FUNCTION_READ_HOLDING else port.read_input
+        for register, count, offset in self.__blocks:
+            rx = await read(address, register, count, priority)
+            length = 2 * count
+            if rx is None or len(rx) < length:
+                return False
+            self.__buffer[offset:offset + length] = rx[:length]
+        return True
+
+    def offset(self, name: str):
+        return self.__offsets[name]
+
+    def uint16(self, name: str, index: int = 0):
+        return read_big_uint16(self.__buffer, self.__offsets[name] + 2 * index)
+
+    def uint32(self, name: str):
+        return read_big_uint32(self.__buffer, self.__offsets[name])
@@ -1,5 +1,10 @@
+from asyncio import sleep_ms
 from machine import Pin, UART
+from micropython import const
 from rp2 import PIO, StateMachine, asm_pio, DMA
+from time import ticks_ms, ticks_diff
+
+_MIN_IDLE_MS = const(10)
 
 @asm_pio(autopull=True, pull_thresh=8, set_init=(PIO.OUT_LOW, PIO.OUT_LOW), sideset_init=PIO.OUT_HIGH, out_init=PIO.OUT_HIGH, out_shiftdir=PIO.SHIFT_RIGHT)
 def uart_tx_18n1():
@@ -136,4 +141,26 @@ def start_dma(port_id: int, sm: StateMachine, data: bytearray):
 
     dma.config(read=data, write=sm, count=len(data), ctrl=dma_ctrl, trigger=True)
 
-    return dma
\ No newline at end of file
+    return dma
+
+
+def get_frame_gap_ms(byte_time_us: float):
+    # 3.5 characters as defined by modbus RTU
+    return round(byte_time_us * 3.5 / 1000 + 0.5)
+
+
+async def receive(uart: UART, buffer: memoryview, byte_time_us: float, timeout: int):
+    # waits up to timeout ms for the first byte, then collects bytes until the line is idle for one frame gap
+    # returns the number of received bytes
+    idle_ms = max(_MIN_IDLE_MS, get_frame_gap_ms(byte_time_us))
+    start = ticks_ms()
+    count = 0
+    while True:
+        await sleep_ms(idle_ms)
+        available = min(uart.any(), len(buffer) - count)
+        if available > 0:
+            count += uart.readinto(buffer[count:count + available], available) or 0
+        elif count > 0:
+            return count
+        elif ticks_diff(ticks_ms(), start) >= timeout:
+            return 0
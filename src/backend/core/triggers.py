@@ -1,15 +1,33 @@
 from asyncio import create_task, sleep_ms
-from .types import run_callbacks
 from micropython import const
-from time import ticks_ms, ticks_diff, time, localtime
+from time import ticks_ms, ticks_us, ticks_add, ticks_diff, time, localtime
 
 TRIGGER_6S = const('trigger_6s')
 TRIGGER_300S = const('trigger_300s')
 
+_TICK_MS = const(250)
+_WHEEL_SIZE = const(64)
+
+class Subscriber:
+    def __init__(self, callback, interval: int, name: str):
+        self.callback = callback
+        self.interval = interval # in ticks
+        self.name = name
+        self.rounds = 0
+        self.period = 0
+        self.calls = 0
+        self.total_us = 0
+        self.max_us = 0
+
 class Triggers:
+    # timer wheel, every subscriber is called with its own interval and phase
+    # the first call of every subscriber after a 5 minute wall clock boundary has type TRIGGER_300S
     def __init__(self):
         self.__worker = None
         self.__subscribers = []
+        self.__wheel = [[] for _ in range(_WHEEL_SIZE)]
+        self.__position = 0
+        self.__period = 0
         self.__next_300s = get_timestamp_of_next_interval(5)
 
     def start(self):
@@ -17,29 +35,97 @@ class Triggers:
         self.__log = Singletons.log.create_logger('triggers')
         self.__worker = create_task(self.__run())
 
-    def add_subscriber(self, callback):
-        self.__subscribers.append(callback)
+    def add_subscriber(self, callback, interval=6, phase=None, name=None):
+        # interval and phase in seconds, without phase the least busy phase is chosen
+        subscriber = Subscriber(callback, max(1, interval * 1000 // _TICK_MS), \
+                                name if name is not None else f'subscriber {len(self.__subscribers)}')
+        self.__subscribers.append(subscriber)
+        if phase is None:
+            offset = self.__get_least_busy_offset(subscriber.interval)
+        else:
+            offset = (phase * 1000 // _TICK_MS) % subscriber.interval
+        self.__schedule(subscriber, subscriber.interval + offset)
 
     async def __run(self):
-        wait_time = 6000
+        next_tick = ticks_ms()
         while True:
+            next_tick = ticks_add(next_tick, _TICK_MS)
+            await sleep_ms(max(0, ticks_diff(next_tick, ticks_ms())))
             try:
-                await sleep_ms(wait_time)
-                ts_start = ticks_ms()
-                run_callbacks(self.__subscribers, self.__get_trigger_type())
-                wait_time = 6000 - ticks_diff(ticks_ms(), ts_start)
+                self.__tick()
             except Exception as e:
                 self.__log.error('Worker cycle failed: ', e)
                 self.__log.trace(e)
 
-    def __get_trigger_type(self):
-        now = time()
-        trigger = TRIGGER_6S
-        if now > self.__next_300s:
+    def __tick(self):
+        if time() > self.__next_300s:
             self.__next_300s = get_timestamp_of_next_interval(5)
+            self.__period += 1
+            self.__print_statistics()
+
+        self.__position = (self.__position + 1) % _WHEEL_SIZE
+        due = self.__wheel[self.__position]
+        if not due:
+            return
+        self.__wheel[self.__position] = []
+        for subscriber in due:
+            if subscriber.rounds > 0:
+                subscriber.rounds -= 1
+                self.__wheel[self.__position].append(subscriber)
+                continue
+            self.__call(subscriber)
+            self.__schedule(subscriber, subscriber.interval)
+
+    def __call(self, subscriber: Subscriber):
+        trigger = TRIGGER_6S
+        if subscriber.period != self.__period:
+            subscriber.period = self.__period
             trigger = TRIGGER_300S
-        return trigger
-    
+        start = ticks_us()
+        try:
+            subscriber.callback(trigger)
+        except Exception as e:
+            self.__log.error('Subscriber ', subscriber.name, ' failed: ', e)
+            self.__log.trace(e)
+        duration = ticks_diff(ticks_us(), start)
+        subscriber.calls += 1
+        subscriber.total_us += duration
+        subscriber.max_us = max(subscriber.max_us, duration)
+
+    def __schedule(self, subscriber: Subscriber, delay: int):
+        self.__wheel[(self.__position + delay) % _WHEEL_SIZE].append(subscriber)
+        subscriber.rounds = (delay - 1) // _WHEEL_SIZE
+
+    def __get_least_busy_offset(self, interval: int):
+        # prefer the slot with the least subscribers, then the one farthest away from other subscribers
+        span = min(interval, _WHEEL_SIZE)
+        start = self.__position + interval
+        best_offset = 0
+        best_score = None
+        for offset in range(span):
+            load = len(self.__wheel[(start + offset) % _WHEEL_SIZE])
+            gap = span
+            for distance in range(1, span // 2 + 1):
+                if self.__wheel[(start + offset + distance) % _WHEEL_SIZE] \
+                        or self.__wheel[(start + offset - distance) % _WHEEL_SIZE]:
+                    gap = distance
+                    break
+            score = (load, -gap)
+            if best_score is None or score < best_score:
+                best_offset = offset
+                best_score = score
+        return best_offset
+
+    def __print_statistics(self):
+        for subscriber in self.__subscribers:
+            if subscriber.calls == 0:
+                continue
+            self.__log.info(subscriber.name, ': ', subscriber.calls, ' calls | ', subscriber.total_us // subscriber.calls, \
+                            ' us average | ', subscriber.max_us, ' us max')
+            subscriber.calls = 0
+            subscriber.total_us = 0
+            subscriber.max_us = 0
+
 def get_timestamp_of_next_interval(interval: int):
     now = localtime()
     now_seconds = time()
@@ -48,5 +134,5 @@ def get_timestamp_of_next_interval(interval: int):
     extra_seconds = (minutes % interval) * 60 + seconds
     seconds_to_add = (interval * 60) - extra_seconds
     return now_seconds + seconds_to_add
-    
+
 triggers = Triggers()
@@ -101,18 +101,87 @@ class InverterStatusValues:
     def from_string(self, str):
         return self.__dict[str]
     
-class CommandFiFo(deque):
-    def __init__(self, size: int):
-        super().__init__(tuple(), size)
+class CommandQueue:
+    # keeps at most one pending instance of each command, priority commands are executed first
+    # commands are compared by identity, so bound methods must be created once and reused
+    def __init__(self, size: int = 16):
         self.event = Event()
+        self.dropped = 0
+        self.__size = size
+        self.__priority = []
+        self.__normal = []
+
+    def __len__(self):
+        return len(self.__priority) + len(self.__normal)
+
+    def append(self, command):
+        if _find(self.__priority, command) >= 0 or _find(self.__normal, command) >= 0:
+            return
+        if len(self) >= self.__size:
+            self.dropped += 1
+            return
+        self.__normal.append(command)
+        self.event.set()
 
-    def append(self, payload):
+    def append_priority(self, command):
+        if _find(self.__priority, command) >= 0:
+            return
+        index = _find(self.__normal, command)
+        if index >= 0:
+            self.__normal.pop(index)
+        elif len(self) >= self.__size:
+            if not self.__normal:
+                self.dropped += 1
+                return
+            self.__normal.pop(0) # priority commands replace the oldest normal command
+            self.dropped += 1
+        self.__priority.append(command)
         self.event.set()
-        super().append(payload)
 
-    def appendleft(self, payload):
+    def popleft(self):
+        return self.__priority.pop(0) if self.__priority else self.__normal.pop(0)
+
+    async def wait_and_clear(self):
+        await self.event.wait()
+        self.event.clear()
+
+def _find(commands: list, command):
+    for i, x in enumerate(commands):
+        if x is command:
+            return i
+    return -1
+    
+class LanedFiFo:
+    # records are (handler, first, second) tuples, so dropping a record never breaks up its arguments
+    # the control lane always drains before the telemetry lane, both lanes drop their oldest records when full
+    def __init__(self, control_size: int, telemetry_size: int):
+        self.event = Event()
+        self.dropped = 0
+        self.dropped_control = 0
+        self.__control = deque(tuple(), control_size)
+        self.__control_size = control_size
+        self.__telemetry = deque(tuple(), telemetry_size)
+        self.__telemetry_size = telemetry_size
+
+    def __len__(self):
+        return len(self.__control) + len(self.__telemetry)
+
+    def append_control(self, handler, first=None, second=None):
+        if len(self.__control) >= self.__control_size:
+            self.__control.popleft()
+            self.dropped_control += 1
+        self.__control.append((handler, first, second))
         self.event.set()
-        super().appendleft(payload)
+
+    def append_telemetry(self, handler, first=None, second=None):
+        if len(self.__telemetry) >= self.__telemetry_size:
+            self.__telemetry.popleft()
+            self.dropped += 1
+        self.__telemetry.append((handler, first, second))
+        self.event.set()
+
+    def popleft(self):
+        return self.__control.popleft() if self.__control else self.__telemetry.popleft()
 
     async def wait_and_clear(self):
         await self.event.wait()
@@ -1,10 +1,10 @@
-from asyncio import sleep
+from asyncio import ThreadSafeFlag, TimeoutError, wait_for_ms
 from bluetooth import UUID as BT_UUID
 from ubinascii import unhexlify
 from ..interfaces.batteryinterface import BatteryInterface
 from ...core.logging import CustomLogger
 from ...core.devicetools import print_battery
-from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError
+from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError, TRANSPORT_BLUETOOTH
 from ...core.types import run_callbacks
 from ...helpers.batterydata import BatteryData
 from ...helpers.streamreader import BigEndianSteamReader
@@ -22,44 +22,47 @@ class Daly8S24V60A(BatteryInterface):
 
         self.__on_data = list()
 
-        self.__device = None
+        self.__device = MicroBleDevice(self.__ble)
         self.__receive_task = None
         self.__receiving = False
+        self.__received = ThreadSafeFlag()
         self.__data = BatteryData(name)
 
     async def read_battery(self):
+        if not await self.__device.acquire():
+            return
         rx_characteristic = None
+        success = False
         try:
-            self.__ble.activate()
             self.__data.reset()
 
-            if self.__device is None:
-                self.__device = MicroBleDevice(self.__ble)
+            new_connection = not self.__device.connected
+            if new_connection:
+                self.__ble.activate()
                 await self.__device.connect(self.__mac, 1, timeout=10000)
-            else:
-                await self.__device.reconnect(timeout=10000)
             
             service = await self.__device.service(BT_UUID(0xfff0))
             tx_characteristic = await service.characteristic(BT_UUID(0xfff2))
             rx_characteristic = await service.characteristic(BT_UUID(0xfff1))
-            rx_descriptor = await rx_characteristic.descriptor()
 
             rx_characteristic.enable_rx(self.__handle_blob)
 
-            await tx_characteristic.write(b'')
-            await rx_descriptor.write(unhexlify('01'), is_request=True)
+            if new_connection:
+                rx_descriptor = await rx_characteristic.descriptor()
+                await tx_characteristic.write(b'')
+                await rx_descriptor.write(unhexlify('01'), is_request=True)
 
+            self.__received.clear()
             self.__receiving = True
             await tx_characteristic.write(unhexlify('d2030000003ed7b9'))
 
-            for _ in range(50):
-                await sleep(0.1)
-                if self.__data.valid:
-                    break
-            else:
+            try:
+                await wait_for_ms(self.__received.wait(), 5000)
+            except TimeoutError:
                 self.__log.error('Failed to receive battery data.')
                 return
             
+            success = True
             print_battery(self.__log, self.__data)
             run_callbacks(self.__on_data, self.__data)
 
@@ -73,9 +76,10 @@ class Daly8S24V60A(BatteryInterface):
                 self.__receive_task.cancel()
             if rx_characteristic is not None:
                 rx_characteristic.disable_rx()
-            if self.__device is not None:
+            if not (success and self.__device.session):
                 await self.__device.disconnect()
-            self.__ble.deactivate()
+                self.__ble.deactivate()
+            self.__device.release(success)
 
     @property
     def on_battery_data(self):
@@ -89,6 +93,10 @@ class Daly8S24V60A(BatteryInterface):
     def device_types(self):
         return self.__device_types
 
+    @property
+    def transport(self):
+        return TRANSPORT_BLUETOOTH
+
     def __handle_blob(self, data):
         if not self.__receiving:
             return
@@ -104,6 +112,7 @@ class Daly8S24V60A(BatteryInterface):
             return
         
         self.__receiving = False
+        self.__received.set()
 
     def __parse(self, data):
         reader = BigEndianSteamReader(data, 0)
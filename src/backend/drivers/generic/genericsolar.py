@@ -66,7 +66,7 @@ class GenericSolar(SolarInterface):
         self.__on_data = list()
 
         self.__worker_task = create_task(self.__worker())
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=name)
 
     @property
     def device_types(self):
@@ -1,11 +1,14 @@
 from asyncio import create_task, sleep
+from time import ticks_ms, ticks_diff
 from ..interfaces.inverterinterface import InverterInterface
 from ...core.addonmodbus import AddOnModbus
+from ...core.busscheduler import PRIORITY_CONTROL, PRIORITY_TELEMETRY
 from ...core.logging import CustomLogger
+from ...core.modbusregistermap import RegisterMap, FUNCTION_READ_HOLDING, FUNCTION_READ_INPUT
 from ...core.triggers import triggers, TRIGGER_300S
 from ...core.types import to_port_id, run_callbacks, STATUS_ON, STATUS_OFF, STATUS_SYNCING, STATUS_FAULT
 from ...core.types import MEASUREMENT_STATUS, MEASUREMENT_POWER, MEASUREMENT_ENERGY
-from ...helpers.streamreader import read_big_uint16, read_big_uint32
+from ...helpers.streamreader import read_big_uint16
 from ...helpers.valueaggregator import ValueAggregator
 
 class RegistersXX00S:
@@ -46,6 +49,7 @@ class GrowattInverterModbus(InverterInterface):
         else:
             raise Exception('Unknown device family: ', family)
         port = config['port']
+        self.__transport = port
         port_id = to_port_id(port)
         if Singletons.ports[port_id] is None:
             self.__port = AddOnModbus(port_id, 9600, 8, None, 1)
@@ -57,6 +61,15 @@ class GrowattInverterModbus(InverterInterface):
         else:
             raise Exception('Port ', port, 'is already in use')
         
+        registers = self.__registers
+        self.__inputs = RegisterMap(FUNCTION_READ_INPUT, {
+            'status': (registers.status, 1),
+            'power': (registers.power, 2),
+            'energy': (registers.energy, 2)})
+        self.__settings = RegisterMap(FUNCTION_READ_HOLDING, {
+            'power_limit': (registers.power_limit, 1),
+            'max_power': (registers.max_power, 2)})
+
         self.__payload_to_status = (STATUS_OFF, STATUS_ON)
 
         self.__active_errors = set()
@@ -69,6 +82,7 @@ class GrowattInverterModbus(InverterInterface):
         self.__shown_status = STATUS_SYNCING
         self.__requested_limit = 0
         self.__device_limit = None
+        self.__request_ticks = None # first target change not written to the device yet
 
         self.__power_avg = ValueAggregator()
 
@@ -79,7 +93,7 @@ class GrowattInverterModbus(InverterInterface):
         self.__on_data = list()
 
         self.__worker_task = create_task(self.__worker())
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=name)
 
     @property
     def device_types(self):
@@ -88,12 +102,17 @@ class GrowattInverterModbus(InverterInterface):
     @property
     def name(self):
         return self.__name
+
+    @property
+    def transport(self):
+        return self.__transport
     
     async def switch_inverter(self, on):
         self.__requested_status = STATUS_ON if on else STATUS_OFF
         if self.__device_status != self.__requested_status:
             self.__requested_limit = 1
             self.__log.info('New target state: ', self.__requested_status)
+            self.__on_request()
     
     async def set_inverter_power(self, power):
         if self.__max_power is None:
@@ -104,6 +123,7 @@ class GrowattInverterModbus(InverterInterface):
         if limit != self.__requested_limit:
             self.__log.info('New power target: ', limit, ' % / ', power, ' W')
             self.__requested_limit = limit
+            self.__on_request()
         return power
     
     @property
@@ -125,27 +145,28 @@ class GrowattInverterModbus(InverterInterface):
         }
     
     async def __worker(self):
-        schedule = (self.__read_power, self.__read_power, self.__read_power, self.__read_power, self.__read_status,\
-            self.__read_power, self.__read_power, self.__read_power, self.__read_power, self.__read_power_limit,\
-            self.__read_power, self.__read_power, self.__read_power, self.__read_power, self.__read_energy)
+        # status, power and energy are read in one block transaction
+        schedule = (self.__read_inputs, self.__read_inputs, self.__read_inputs, self.__read_inputs, self.__read_power_limit)
 
         while True:
             for request in schedule:
                 try:
                     if self.__max_power is None:
-                        await self.__read_max_power()
+                        await self.__read_settings()
                         await sleep(1)
                         
                     if self.__device_status != self.__requested_status:
                         await self.__write_state()
+                        self.__on_command_written()
                         await sleep(1)
-                        await self.__read_status()
+                        await self.__read_inputs(PRIORITY_CONTROL)
                         await sleep(1)
 
                     if self.__device_limit != self.__requested_limit:
                         await self.__write_limit()
+                        self.__on_command_written()
                         await sleep(1)
-                        await self.__read_power_limit()
+                        await self.__read_power_limit(PRIORITY_CONTROL)
                         await sleep(1)
 
                     await request()
@@ -172,6 +193,16 @@ class GrowattInverterModbus(InverterInterface):
             self.__log.error('Trigger cycle failed: ', e)
             self.__log.trace(e)
 
+    def __on_request(self):
+        if self.__request_ticks is None:
+            self.__request_ticks = ticks_ms()
+
+    def __on_command_written(self):
+        # time from the decision until the command was written to the device
+        if self.__request_ticks is not None:
+            self.__log.info('Command written ', ticks_diff(ticks_ms(), self.__request_ticks), ' ms after request')
+            self.__request_ticks = None
+
     def __get_energy(self):
         energy = self.__energy
         self.__energy = 0
@@ -205,80 +236,68 @@ class GrowattInverterModbus(InverterInterface):
             run_callbacks(self.__on_data, self, {MEASUREMENT_STATUS: new_status})
 
     async def __write_state(self):
-        async with self.__port.lock:
-            self.__log.info('Set state to ', self.__requested_status)
-            value = (1 if self.__requested_status == STATUS_ON else 0) | self.__registers.switch_flags
-            rx = await self.__port.write_single(self.__slave_address, self.__registers.switch, value)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not write device state: communication error'):
-                return
-            received_state = read_big_uint16(rx, 0) # type: ignore
-            self.__handle_communication_error(received_state != value, 'Can not write device state: different value received')
+        self.__log.info('Set state to ', self.__requested_status)
+        value = (1 if self.__requested_status == STATUS_ON else 0) | self.__registers.switch_flags
+        rx = await self.__port.write_single(self.__slave_address, self.__registers.switch, value)
+        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not write device state: communication error'):
+            return
+        received_state = read_big_uint16(rx, 0) # type: ignore
+        self.__handle_communication_error(received_state != value, 'Can not write device state: different value received')
 
     async def __write_limit(self):
-        async with self.__port.lock:
-            self.__log.info('Set limit to ', self.__requested_limit, ' %')
-            # enable temporary mode
-            rx = await self.__port.write_single(self.__slave_address, self.__registers.temporary, 1)
-            if self.__handle_communication_error(rx is None, 'Can not enable temporary mode: communication error'):
-                return
-            temporary_mode = read_big_uint16(rx, 0) # type: ignore
-            if self.__handle_communication_error(temporary_mode != 1, 'Can not enable temporary mode: different value received'):
-                return
-            # write limit
-            rx = await self.__port.write_single(self.__slave_address, self.__registers.power_limit, self.__requested_limit)
-            if self.__handle_communication_error(rx is None, 'Can not write power limit: communication error'):
-                return
-            limit = read_big_uint16(rx, 0) # type: ignore
-            if self.__handle_communication_error(limit != self.__requested_limit, 'Can not write power limit: different value received'):
-                return
+        self.__log.info('Set limit to ', self.__requested_limit, ' %')
+        # enable temporary mode
+        rx = await self.__port.write_single(self.__slave_address, self.__registers.temporary, 1)
+        if self.__handle_communication_error(rx is None, 'Can not enable temporary mode: communication error'):
+            return
+        temporary_mode = read_big_uint16(rx, 0) # type: ignore
+        if self.__handle_communication_error(temporary_mode != 1, 'Can not enable temporary mode: different value received'):
+            return
+        # write limit
+        rx = await self.__port.write_single(self.__slave_address, self.__registers.power_limit, self.__requested_limit)
+        if self.__handle_communication_error(rx is None, 'Can not write power limit: communication error'):
+            return
+        limit = read_big_uint16(rx, 0) # type: ignore
+        if self.__handle_communication_error(limit != self.__requested_limit, 'Can not write power limit: different value received'):
+            return
 
-    async def __read_status(self):
-        async with self.__port.lock:
-            rx = await self.__port.read_input(self.__slave_address, self.__registers.status, 1)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read device status: communication error'):
-                return
-            try:
-                status = self.__payload_to_status[read_big_uint16(rx, 0)] # type: ignore
-            except:
-                status = STATUS_FAULT
-            if status != self.__device_status:
-                self.__device_status = status
-                self.__handle_status_change()
+    async def __read_inputs(self, priority=PRIORITY_TELEMETRY):
+        success = await self.__inputs.read(self.__port, self.__slave_address, priority)
+        if self.__handle_communication_error(not success, 'Can not read device status: communication error'):
+            return
+        try:
+            status = self.__payload_to_status[self.__inputs.uint16('status')]
+        except:
+            status = STATUS_FAULT
+        if status != self.__device_status:
+            self.__device_status = status
+            self.__handle_status_change()
 
-    async def __read_power(self):
-        async with self.__port.lock:
-            rx = await self.__port.read_input(self.__slave_address, self.__registers.power, 2)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read power: communication error'):
-                return
-            self.__power_avg.add(round(read_big_uint32(rx , 0) / 10)) # type: ignore
+        self.__power_avg.add(round(self.__inputs.uint32('power') / 10))
 
-    async def __read_energy(self):
-        async with self.__port.lock:
-            rx = await self.__port.read_input(self.__slave_address, self.__registers.energy, 2)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 4), 'Can not read energy: communication error'):
-                return
-            energy = round(read_big_uint32(rx, 0) * 100) # type: ignore
+        energy = round(self.__inputs.uint32('energy') * 100)
+        if self.__last_energy is None:
             self.__log.info('Total energy=', energy, ' Wh')
-            if self.__last_energy is None:
-                self.__last_energy = energy
-            elif energy > self.__last_energy:
-                delta = energy - self.__last_energy
-                self.__energy += delta
-                self.__last_energy = energy
+            self.__last_energy = energy
+        elif energy > self.__last_energy:
+            self.__log.info('Total energy=', energy, ' Wh')
+            delta = energy - self.__last_energy
+            self.__energy += delta
+            self.__last_energy = energy
 
-    async def __read_power_limit(self):
-        async with self.__port.lock:
-            rx = await self.__port.read_holding(self.__slave_address, self.__registers.power_limit, 1)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read power limit: communication error'):
-                return
-            self.__device_limit = read_big_uint16(rx, 0) # type: ignore
-            self.__log.info('Limit=', self.__device_limit, ' %')
+    async def __read_power_limit(self, priority=PRIORITY_TELEMETRY):
+        rx = await self.__port.read_holding(self.__slave_address, self.__registers.power_limit, 1, priority)
+        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read power limit: communication error'):
+            return
+        self.__device_limit = read_big_uint16(rx, 0) # type: ignore
+        self.__log.info('Limit=', self.__device_limit, ' %')
 
-    async def __read_max_power(self):
-        async with self.__port.lock:
-            rx = await self.__port.read_holding(self.__slave_address, self.__registers.max_power, 2)
-            if self.__handle_communication_error((rx is None) or (len(rx) < 4), 'Can not read maximum power: communication error'):
-                return
-            self.__max_power = read_big_uint32(rx, 0) / 10
-            self.__log.info('Maximum power=', self.__max_power, ' W')
-            self.__handle_status_change()
+    async def __read_settings(self):
+        success = await self.__settings.read(self.__port, self.__slave_address)
+        if self.__handle_communication_error(not success, 'Can not read maximum power: communication error'):
+            return
+        self.__device_limit = self.__settings.uint16('power_limit')
+        self.__log.info('Limit=', self.__device_limit, ' %')
+        self.__max_power = self.__settings.uint32('max_power') / 10
+        self.__log.info('Maximum power=', self.__max_power, ' W')
+        self.__handle_status_change()
@@ -1,8 +1,9 @@
 from asyncio import create_task, sleep
-from binascii import hexlify
 from ..interfaces.chargerinterface import ChargerInterface
 from ...core.addonmodbus import AddOnModbus
+from ...core.busscheduler import PRIORITY_CONTROL, PRIORITY_TELEMETRY
 from ...core.logging import CustomLogger
+from ...core.modbusregistermap import RegisterMap, FUNCTION_READ_INPUT
 from ...core.triggers import triggers, TRIGGER_300S
 from ...core.types import to_port_id, run_callbacks, STATUS_ON, STATUS_OFF, STATUS_SYNCING, STATUS_FAULT
 from ...core.types import MEASUREMENT_STATUS, MEASUREMENT_POWER, MEASUREMENT_ENERGY
@@ -42,6 +43,15 @@ class HeidelbergWallbox(ChargerInterface):
             STATUS_OFF, # wallbox locked \
             STATUS_FAULT) # wallbox error
 
+        self.__measurements = RegisterMap(FUNCTION_READ_INPUT, {
+            'status': (5, 1),
+            'currents': (6, 3),
+            'power': (14, 1)})
+        self.__hardware = RegisterMap(FUNCTION_READ_INPUT, {
+            'register_version': (4, 1),
+            'max_current': (100, 1),
+            'min_current': (101, 1)})
+
         self.__active_errors = set()
         self.__error_debounced = False
 
@@ -65,7 +75,7 @@ class HeidelbergWallbox(ChargerInterface):
         self.__on_data = []
 
         self.__worker_task = create_task(self.__worker())
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=name)
 
     @property
     def device_types(self):
@@ -91,27 +101,20 @@ class HeidelbergWallbox(ChargerInterface):
     ###############
 
     async def __worker(self):
-        schedule = (self.__read_status, self.__read_current, self.__read_current_limit, self.__read_power)
+        # status, currents and power are read in one block transaction
+        schedule = (self.__read_measurements, self.__read_current_limit)
 
         while True:
             for request in schedule:
                 try:
                     if self.__register_version is None:
-                        await self.__read_register_version()
-                        await sleep(1)
-
-                    if self.__hw_min_current is None:
-                        await self.__read_hardware_minimal_current()
-                        await sleep(1)
-
-                    if self.__hw_max_current is None:
-                        await self.__read_hardware_maximal_current()
+                        await self.__read_hardware()
                         await sleep(1)
 
                     if self.__actual_current_limit != self.__requested_current_limit:
                         await self.__write_current_limit()
                         await sleep(1)
-                        await self.__read_current_limit()
+                        await self.__read_current_limit(PRIORITY_CONTROL)
                         await sleep(1)
 
                     await request()
@@ -157,12 +160,12 @@ class HeidelbergWallbox(ChargerInterface):
             self.__shown_status = new_status
             run_callbacks(self.__on_data, self, {MEASUREMENT_STATUS: new_status})
 
-    async def __read_status(self):
-        rx = await self.__port.read_input(self.__slave_address, 5, 1)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read device status: communication error'):
+    async def __read_measurements(self):
+        success = await self.__measurements.read(self.__port, self.__slave_address)
+        if self.__handle_communication_error(not success, 'Can not read device status: communication error'):
             return
         try:
-            raw_status = read_big_uint16(rx, 0)
+            raw_status = self.__measurements.uint16('status')
             status = self.__payload_to_status[raw_status] # type: ignore
         except:
             status = STATUS_FAULT
@@ -171,46 +174,25 @@ class HeidelbergWallbox(ChargerInterface):
             self.__device_status = status
             self.__handle_status_change()
 
-    async def __read_register_version(self):
-        rx = await self.__port.read_input(self.__slave_address, 4, 1)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read register version: communication error'):
-            return
-        value = read_big_uint16(rx, 0)
-        self.__log.info('Register version=', hexlify(rx))
-        self.__register_version = value
-
-    async def __read_hardware_minimal_current(self):
-        rx = await self.__port.read_input(self.__slave_address, 101, 1)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read hardware minimal current: communication error'):
-            return
-        amperes = read_big_uint16(rx, 0)
-        self.__log.info('Hardware minimal current=', amperes, ' A')
-        self.__hw_min_current = amperes
-
-    async def __read_hardware_maximal_current(self):
-        rx = await self.__port.read_input(self.__slave_address, 100, 1)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read hardware maximal current: communication error'):
-            return
-        amperes = read_big_uint16(rx, 0)
-        self.__log.info('Hardware maximal current=', amperes, ' A')
-        self.__hw_max_current = amperes
-
-    async def __read_current(self):
-        rx = await self.__port.read_input(self.__slave_address, 6, 3)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 6), 'Can not read current: communication error'):
-            return
-        amperes = tuple(read_big_uint16(rx, 2 * i) / 10 for i in range(3))
+        amperes = tuple(self.__measurements.uint16('currents', i) / 10 for i in range(3))
         self.__log.info('Currents=', amperes[0], ' A | ', amperes[1], ' A | ', amperes[2], ' A')
 
-    async def __read_power(self):
-        rx = await self.__port.read_input(self.__slave_address, 14, 1)
-        if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read power: communication error'):
-            return
-        power = read_big_uint16(rx, 0) / 1000
+        power = self.__measurements.uint16('power') / 1000
         self.__log.info('Power=', power, ' W')
 
-    async def __read_current_limit(self):
-        rx = await self.__port.read_holding(self.__slave_address, 261, 1)
+    async def __read_hardware(self):
+        success = await self.__hardware.read(self.__port, self.__slave_address)
+        if self.__handle_communication_error(not success, 'Can not read register version: communication error'):
+            return
+        self.__hw_min_current = self.__hardware.uint16('min_current')
+        self.__log.info('Hardware minimal current=', self.__hw_min_current, ' A')
+        self.__hw_max_current = self.__hardware.uint16('max_current')
+        self.__log.info('Hardware maximal current=', self.__hw_max_current, ' A')
+        self.__register_version = self.__hardware.uint16('register_version')
+        self.__log.info('Register version=', hex(self.__register_version))
+
+    async def __read_current_limit(self, priority=PRIORITY_TELEMETRY):
+        rx = await self.__port.read_holding(self.__slave_address, 261, 1, priority)
         if self.__handle_communication_error((rx is None) or (len(rx) < 2), 'Can not read current limit: communication error'):
             return
         amperes = read_big_uint16(rx, 0) / 10
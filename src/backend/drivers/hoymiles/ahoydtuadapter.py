@@ -2,6 +2,7 @@ from asyncio import sleep
 from ...core.microaiohttp import ClientSession
 from ...core.types import STATUS_FAULT, STATUS_OFF, STATUS_ON, STATUS_SYNCING
 from .dtuadapter import DtuAdapter
+from .dtupoller import get_poller
 from .anydtu import AnyDtu
 
 class AhoyDtu(AnyDtu):
@@ -16,6 +17,7 @@ class AhoyDtuAdapter(DtuAdapter):
         self.__host, self.__port = config['host'].split(':')
         self.__port = int(self.__port)
         self.__id = config['id']
+        self.__poller = get_poller(config['host'])
         self.__ui = Singletons.ui
 
         self.__ahoy_state_to_internal_state = {
@@ -46,8 +48,7 @@ class AhoyDtuAdapter(DtuAdapter):
         await self.__send_command(command)
 
     async def read(self):
-        with self.__create_session() as session:
-            json = await self.__get(session, f'api/inverter/id/{self.__id}')
+        json = await self.__poller.read(f'api/inverter/id/{self.__id}', self.__read_query)
         try:
             status = self.__ahoy_state_to_internal_state.get(int(json['status']), STATUS_FAULT)
             limit = int(json['power_limit_read'])
@@ -56,27 +57,33 @@ class AhoyDtuAdapter(DtuAdapter):
             self.__log.error('No status available.')
             return None, None
 
+    async def __read_query(self, query):
+        with self.__create_session() as session:
+            return await self.__get(session, query)
+
     async def __send_command(self, command):
+        await self.__poller.send('api/ctrl', command, self.__post_command)
+
+    async def __post_command(self, query, payload):
         with self.__create_session() as session:
-            await self.__post(session, 'api/ctrl', command)
+            return await self.__post(session, query, payload)
 
     def __create_session(self):
         return ClientSession(self.__log, self.__host, self.__port)
     
     async def __get(self, session, query):
-        for i in reversed(range(3)):
-           try:
-               response = await session.get(query)
-               status = response.status
-               if status >= 200 and status <= 299:
-                   json = await response.json()
-                   self.__ui.notify_control()
-                   return json
-               else:
-                   self.__log.error('Inverter query ', query, ' failed with code ', status, ', ', i, ' retries left.')
-           except Exception as e:
-                self.__log.error('Inverter query ', query, ' failed: ', e, ', ', i, ' retries left.')
-           await sleep(1)
+        # one attempt, retries are done by the poller, so commands can be sent in between
+        try:
+            response = await session.get(query)
+            status = response.status
+            if status >= 200 and status <= 299:
+                json = await response.json()
+                self.__ui.notify_control()
+                return json
+            else:
+                self.__log.error('Inverter query ', query, ' failed with code ', status, '.')
+        except Exception as e:
+            self.__log.error('Inverter query ', query, ' failed: ', e)
         return None
 
     async def __post(self, session, query, payload):
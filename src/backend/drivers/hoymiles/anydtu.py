@@ -1,6 +1,6 @@
 from asyncio import Event, create_task, sleep, Lock
 from micropython import const
-from time import time
+from time import time, ticks_ms, ticks_diff
 from ..interfaces.inverterinterface import InverterInterface
 from ...core.logging import CustomLogger
 from ...core.triggers import triggers, TRIGGER_300S
@@ -14,6 +14,17 @@ _CMD_TURN_OFF = const('turn_off')
 _CMD_RESET = const('reset')
 _CMD_CHANGE_POWER = const('change_power')
 
+_RX_INTERVAL = const(2) # s
+_WAIT_SWITCH = const(30) # s until a command is repeated
+_WAIT_RESET = const(60)
+_WAIT_CHANGE_POWER = const(30)
+_WAIT_PUSH = const(10) # s, pushed updates confirm commands without waiting for the next poll
+
+_LATENCY_SAMPLES = const(16) # power change acknowledgements kept for the wait time estimation
+_LATENCY_MIN_SAMPLES = const(4)
+_WAIT_POWER_MIN = const(5000) # ms
+_WAIT_POWER_MAX = const(30000) # ms, the former fixed wait time
+
 class AnyDtu(InverterInterface):
     def __init__(self, name, config, adapter: DtuAdapter):
         from ...core.singletons import Singletons
@@ -33,6 +44,7 @@ class AnyDtu(InverterInterface):
         self.__power_lut = PowerLut(config['power_lut'])
 
         self.__name = name
+        self.__transport = config['host']
         self.__public_status = STATUS_SYNCING
         self.__public_power = 0
         self.__target_power = 0
@@ -41,12 +53,17 @@ class AnyDtu(InverterInterface):
 
         self.__last_command_type = None
         self.__last_status_command_type = None
+        self.__power_command_ticks = None # first command for the current power target
+        self.__power_sent_ticks = None # last command for the current power target
+        self.__power_repeated = False # the current power target needed more than one command
+        self.__latencies = []
+        self.__request_ticks = None # first target change not sent to the dtu yet
         self.__energy = ValueAggregator() # unusual unit: Ws , too keep things integer can only divide once by 3600
 
         self.__lock = Lock()
         self.__rx_task = create_task(self.__do_rx())
         self.__tx_task = create_task(self.__do_tx())
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=name)
 
 ###################
 # General
@@ -59,6 +76,10 @@ class AnyDtu(InverterInterface):
     @property
     def device_types(self):
         return self.__device_types
+
+    @property
+    def transport(self):
+        return self.__transport
     
 ###################
 # Status
@@ -69,6 +90,8 @@ class AnyDtu(InverterInterface):
             return
         self.__target_power = self.__power_lut.min_power if on else 0
         self.__log.info('New target state: ', 'on' if on else 'off')
+        self.__power_command_ticks = None # a pending acknowledgement belongs to the previous target
+        self.__on_request()
         self.__tx_event.set()
     
     @property
@@ -89,6 +112,8 @@ class AnyDtu(InverterInterface):
         if target_power != self.__target_power:
             self.__target_power = target_power
             self.__log.info('New power target: ', target_percent, ' % / ', self.__target_power, ' W')
+            self.__power_command_ticks = None # a pending acknowledgement belongs to the previous target
+            self.__on_request()
             self.__tx_event.set()
         return target_power
     
@@ -136,6 +161,9 @@ class AnyDtu(InverterInterface):
                 MEASUREMENT_ENERGY: self.__get_energy()
             }
             run_callbacks(self.__on_data, self, data)
+            if len(self.__latencies) >= _LATENCY_MIN_SAMPLES:
+                self.__log.info('Power change latency p50=', self.__get_latency(50), ' ms p90=', self.__get_latency(90), \
+                                ' ms, wait time=', self.__get_power_wait_time(), ' s')
         except Exception as e:
             self.__log.error('Trigger cycle failed: ', e)
             self.__log.trace(e)
@@ -166,7 +194,7 @@ class AnyDtu(InverterInterface):
     async def __do_rx(self):
         while True:
             try:
-                await sleep(2)
+                await self.__adapter.wait(_RX_INTERVAL)
                 async with self.__lock:
                     await self.__sync_from_inverters()
                 self.__energy.add(self.__public_power)
@@ -206,6 +234,7 @@ class AnyDtu(InverterInterface):
             await self.__adapter.switch_off()
             self.__last_tx = time()
             self.__tx_event.clear()
+            self.__on_command_sent()
             return True
         
         #prio 2: reset (a power change will not survive reset, so reset first)
@@ -216,6 +245,7 @@ class AnyDtu(InverterInterface):
             await self.__adapter.reset()
             self.__last_tx = time()
             self.__tx_event.clear()
+            self.__on_command_sent()
             return True
         
         #prio 3: change power
@@ -225,7 +255,18 @@ class AnyDtu(InverterInterface):
             percent, _ = self.__power_lut.get_percent(self.__target_power)
             await self.__adapter.change_power(percent)
             self.__last_tx = time()
+            now = ticks_ms()
+            if self.__power_command_ticks is None:
+                self.__power_command_ticks = now
+                self.__power_repeated = False
+            elif not self.__power_repeated:
+                # the first attempt was not acknowledged within the wait time, this is counted once per target,
+                # the acknowledgement of a repeated command is no sample, otherwise lost commands inflate the wait time
+                self.__add_latency(ticks_diff(now, self.__power_sent_ticks))
+                self.__power_repeated = True
+            self.__power_sent_ticks = now
             self.__tx_event.clear()
+            self.__on_command_sent()
             return True
         
         #prio 4: switch on
@@ -236,10 +277,21 @@ class AnyDtu(InverterInterface):
             await self.__adapter.switch_on()
             self.__last_tx = time()
             self.__tx_event.clear()
+            self.__on_command_sent()
             return True
         
         return False
 
+    def __on_request(self):
+        if self.__request_ticks is None:
+            self.__request_ticks = ticks_ms()
+
+    def __on_command_sent(self):
+        # time from the decision until the command reached the dtu
+        if self.__request_ticks is not None:
+            self.__log.info('Command sent ', ticks_diff(ticks_ms(), self.__request_ticks), ' ms after request')
+            self.__request_ticks = None
+
     async def __sync_from_inverters(self):
         try:
             status, limit = await self.__adapter.read()
@@ -268,6 +320,11 @@ class AnyDtu(InverterInterface):
             if self.__public_status == STATUS_ON:
                 self.__set_public_power(self.__device_power)
 
+        if self.__power_command_ticks is not None and self.__is_power_synced:
+            if not self.__power_repeated:
+                self.__add_latency(ticks_diff(ticks_ms(), self.__power_command_ticks))
+            self.__power_command_ticks = None
+
         if not self.__is_status_synced or not self.__is_power_synced:
             self.__log.info('target_power=', self.__target_power, ' device_status=', self.__public_status, ' device_power=', self.__device_power)
 
@@ -277,15 +334,31 @@ class AnyDtu(InverterInterface):
             if self.__is_status_synced:
                 return 0
             else:
-                return 30
+                return _WAIT_PUSH if self.__adapter.push else _WAIT_SWITCH
         elif self.__last_command_type == _CMD_RESET:
             if self.__is_status_synced:
                 return 0
             else:
-                return 60
+                return _WAIT_RESET
         elif self.__last_command_type == _CMD_CHANGE_POWER:
             if self.__is_power_synced:
                 return 0
             else:
-                return 30
+                return self.__get_power_wait_time()
         return 0
+
+    def __add_latency(self, latency: int):
+        if len(self.__latencies) >= _LATENCY_SAMPLES:
+            self.__latencies.pop(0)
+        self.__latencies.append(latency)
+
+    def __get_latency(self, percentile: int):
+        samples = sorted(self.__latencies)
+        return samples[(len(samples) - 1) * percentile // 100]
+
+    def __get_power_wait_time(self):
+        # repeat a power change once it took clearly longer than most acknowledgements of this inverter
+        if len(self.__latencies) < _LATENCY_MIN_SAMPLES:
+            return _WAIT_PUSH if self.__adapter.push else _WAIT_CHANGE_POWER
+        wait = self.__get_latency(90) * 5 // 4 + _RX_INTERVAL * 1000
+        return min(_WAIT_POWER_MAX, max(_WAIT_POWER_MIN, wait)) / 1000
@@ -1,9 +1,18 @@
-
+from asyncio import sleep
 
 class DtuAdapter:
     def configure(self, log):
         pass
 
+    @property
+    def push(self):
+        # True if status updates are pushed by the dtu
+        return False
+
+    async def wait(self, timeout: int):
+        # waits until new data is available, at most timeout seconds
+        await sleep(timeout)
+
     async def switch_on(self):
         raise NotImplementedError()
 
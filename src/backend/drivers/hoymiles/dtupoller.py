@@ -0,0 +1,57 @@
+from asyncio import Event, Lock, sleep
+from micropython import const
+from time import ticks_ms, ticks_diff
+
+_MAX_AGE = const(3000) # ms, 1.5 times the read interval of AnyDtu, so loops of all inverters fall into one cycle
+_READ_ATTEMPTS = const(3)
+
+class DtuPoller:
+    # One poller per DTU host, shared by all inverters of this host.
+    # Requests to the host are serialized, reads of the same query within one cycle are served from the
+    # last response, so all inverters of a DTU share one status request per cycle.
+    # Commands go first: reads wait while commands are pending and release the host between their attempts,
+    # so a command waits for at most one read request.
+    def __init__(self):
+        self.__lock = Lock()
+        self.__cache = {}
+        self.__commands = 0
+        self.__no_commands = Event()
+        self.__no_commands.set()
+
+    async def read(self, query: str, fetch):
+        # fetch(query) is one request, returning None on failure, it is only awaited if there is no recent response
+        for i in reversed(range(_READ_ATTEMPTS)):
+            await self.__no_commands.wait()
+            async with self.__lock:
+                entry = self.__cache.get(query, None)
+                if entry is not None and ticks_diff(ticks_ms(), entry[0]) < _MAX_AGE:
+                    return entry[1]
+                result = await fetch(query)
+                if result is not None or i == 0:
+                    # failed requests are kept as well, so a busy dtu is not queried again by every inverter
+                    self.__cache[query] = (ticks_ms(), result)
+                    return result
+            await sleep(1)
+
+    async def send(self, query: str, payload, post):
+        self.__commands += 1
+        self.__no_commands.clear()
+        try:
+            async with self.__lock:
+                result = await post(query, payload)
+                # responses before the command do not show its effect
+                self.__cache.clear()
+                return result
+        finally:
+            self.__commands -= 1
+            if self.__commands == 0:
+                self.__no_commands.set()
+
+_pollers = {}
+
+def get_poller(host: str):
+    poller = _pollers.get(host, None)
+    if poller is None:
+        poller = DtuPoller()
+        _pollers[host] = poller
+    return poller
@@ -1,7 +1,9 @@
-from asyncio import sleep
+from asyncio import sleep, wait_for, TimeoutError
 from ...core.microaiohttp import ClientSession, BasicAuth
 from ...core.types import STATUS_FAULT, STATUS_OFF, STATUS_ON, STATUS_SYNCING
 from .dtuadapter import DtuAdapter
+from .dtupoller import get_poller
+from .opendtulivedata import get_live_data
 from .anydtu import AnyDtu
 
 class OpenDtu(AnyDtu):
@@ -17,12 +19,29 @@ class OpenDtuAdapter(DtuAdapter):
         self.__port = int(self.__port)
         self.__auth = BasicAuth("admin", config['password'])
         self.__serial = config['serial']
+        self.__poller = get_poller(config['host'])
+        self.__live_data = get_live_data(self.__host, self.__port, self.__auth) if config.get('websocket', False) else None
         self.__ui = Singletons.ui
 
 
     def configure(self, log):
         self.__log = log
 
+    @property
+    def push(self):
+        return self.__live_data is not None and self.__live_data.connected
+
+    async def wait(self, timeout: int):
+        if self.__live_data is None:
+            await sleep(timeout)
+            return
+        event = self.__live_data.get_event(self.__serial)
+        try:
+            await wait_for(event.wait(), timeout)
+        except TimeoutError:
+            pass
+        event.clear()
+
     async def switch_on(self):
         command = f'"serial":"{self.__serial}","power":true'
         await self.__send_command('power', command)
@@ -40,11 +59,13 @@ class OpenDtuAdapter(DtuAdapter):
         await self.__send_command('limit', command)
 
     async def read(self):
-        with self.__create_session() as session:
-            json = await self.__get(session, 'livedata/status')
         try:
-            data = {x['serial']: (x['producing'], x['reachable'], x['limit_relative']) for x in json['inverters']}
-            producing, reachable, limit = data[self.__serial]
+            if self.push and self.__live_data.get(self.__serial) is not None:
+                producing, reachable, limit = self.__live_data.get(self.__serial)
+            else:
+                # the status of all inverters of the dtu is read once and shared
+                data = await self.__poller.read('livedata/status', self.__read_status)
+                producing, reachable, limit = data[self.__serial]
             if reachable:
                 status = STATUS_ON if producing else STATUS_OFF
                 limit = int(limit)
@@ -56,27 +77,36 @@ class OpenDtuAdapter(DtuAdapter):
             self.__log.error(f'No status available.')
             return None, None
 
+    async def __read_status(self, query):
+        with self.__create_session() as session:
+            json = await self.__get(session, query)
+        if json is None:
+            return None
+        return {x['serial']: (x['producing'], x['reachable'], x['limit_relative']) for x in json['inverters']}
+
     async def __send_command(self, domain, command):
+        await self.__poller.send(f'{domain}/config', 'data={'+command+'}', self.__post_command)
+
+    async def __post_command(self, query, payload):
         with self.__create_session() as session:
-            await self.__post(session, f'{domain}/config', 'data={'+command+'}')
+            return await self.__post(session, query, payload)
 
     def __create_session(self):
         return ClientSession(self.__log, self.__host, self.__port, self.__auth)
 
     async def __get(self, session, query):
-        for i in reversed(range(3)):
-           try:
-               response = await session.get(f'api/{query}')
-               status = response.status
-               if status >= 200 and status <= 299:
-                   json = await response.json()
-                   self.__ui.notify_control()
-                   return json
-               else:
-                   self.__log.error(f'Inverter query {query} failed with code {status}, {i} retries left.')
-           except Exception as e:
-               self.__log.error(f'Inverter query {query} failed: {str(e)}, {i} retries left.')
-           await sleep(1)
+        # one attempt, retries are done by the poller, so commands can be sent in between
+        try:
+            response = await session.get(f'api/{query}')
+            status = response.status
+            if status >= 200 and status <= 299:
+                json = await response.json()
+                self.__ui.notify_control()
+                return json
+            else:
+                self.__log.error(f'Inverter query {query} failed with code {status}.')
+        except Exception as e:
+            self.__log.error(f'Inverter query {query} failed: {str(e)}')
         return None
     
     async def __post(self, session, query, payload):
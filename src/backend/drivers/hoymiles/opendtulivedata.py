@@ -0,0 +1,68 @@
+from asyncio import create_task, sleep, Event
+from json import loads
+from micropython import const
+from ...core.microwebsocket import WebSocketClient, OPCODE_TEXT
+
+_RECONNECT_INTERVAL = const(10) # s
+
+class OpenDtuLiveData:
+    # One websocket connection per OpenDTU host, shared by all inverters of this host.
+    # OpenDTU pushes the live data of an inverter as soon as it changes, every update sets the event of the inverter.
+    def __init__(self, host: str, port: int, auth):
+        from ...core.singletons import Singletons
+        self.__log = Singletons.log.create_logger(f'livedata_{host}')
+        self.__client = WebSocketClient(self.__log, host, port, 'livedata', auth)
+        self.__inverters = {}
+        self.__events = {}
+        self.__task = create_task(self.__run())
+
+    @property
+    def connected(self):
+        return self.__client.is_connected
+
+    def get(self, serial: str):
+        # (producing, reachable, limit_relative) or None if no update was received yet
+        return self.__inverters.get(serial, None)
+
+    def get_event(self, serial: str):
+        event = self.__events.get(serial, None)
+        if event is None:
+            event = Event()
+            self.__events[serial] = event
+        return event
+
+    async def __run(self):
+        while True:
+            try:
+                await self.__client.connect()
+                self.__log.info('Websocket connected.')
+                while True:
+                    opcode, payload = await self.__client.receive()
+                    if opcode == OPCODE_TEXT:
+                        self.__parse(payload)
+            except Exception as e:
+                self.__log.error('Websocket failed: ', e)
+            self.__client.close()
+            self.__inverters.clear()
+            await sleep(_RECONNECT_INTERVAL)
+
+    def __parse(self, payload):
+        json = loads(str(payload, 'utf-8'))
+        for inverter in json.get('inverters', ()):
+            try:
+                serial = inverter['serial']
+                self.__inverters[serial] = (inverter['producing'], inverter['reachable'], inverter['limit_relative'])
+            except KeyError:
+                continue
+            event = self.__events.get(serial, None)
+            if event is not None:
+                event.set()
+
+_live_data = {}
+
+def get_live_data(host: str, port: int, auth):
+    live_data = _live_data.get(host, None)
+    if live_data is None:
+        live_data = OpenDtuLiveData(host, port, auth)
+        _live_data[host] = live_data
+    return live_data
@@ -6,4 +6,9 @@ class DriverInterface():
     
     @property
     def name(self):
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+    @property
+    def transport(self):
+        # devices returning the same value share a physical transport and must not be accessed concurrently
+        return self.name
\ No newline at end of file
@@ -1,61 +1,39 @@
-from asyncio import sleep
+from asyncio import sleep, ThreadSafeFlag, TimeoutError, wait_for_ms
+from micropython import const
 from bluetooth import UUID as BT_UUID
 from ubinascii import unhexlify
 from ..interfaces.batteryinterface import BatteryInterface
 from ...core.devicetools import print_battery
-from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError
+from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError, TRANSPORT_BLUETOOTH
 from ...core.logging import CustomLogger
 from ...core.types import run_callbacks
 from ...helpers.batterydata import BatteryData
+from ...helpers.frameassembler import FrameAssembler
 from ...helpers.streamreader import read_little_uint8, read_little_uint16, read_little_int16, read_little_uint32, read_little_int32
 
+_RESPONSE_TIMEOUT = const(10000)
+
 # ressources:
 
 class JkBmsBd(BatteryInterface):
-    class MesssageDecoder:
+    class MesssageDecoder(FrameAssembler):
         def __init__(self, log):
+            super().__init__(300, b'\x55\xaa\xeb\x90\x02', 6)
             self.__log: CustomLogger = log
-            self.__length = 294 # 300 bytes - 6 bytes header
-            self.__data = None
-            self.__checksum = 0
-            self.__success = None
-
-        def read(self, blob):
-            if self.__success is not None:
-                return
-            self.__success = False
-            if self.__data is None:
-                if len(blob) >= 7 \
-                        and blob[0] == 0x55 and blob[1] == 0xaa and blob[2] == 0xeb and blob[3] == 0x90 \
-                        and blob[4] == 0x02:
-                    self.__data = blob[6:]
-                    for i in range(len(blob)):
-                        self.__checksum += blob[i]
-                else:
-                    self.__success = None
-                    return
-            else:
-                self.__data += bytearray(blob)
-                for i in range(len(blob) - 1):
-                    self.__checksum += blob[i]
 
-            if len(self.__data) < self.__length: # type: ignore
-                self.__success = None
-            else:
-                checksum = self.__checksum & 0xFF
-                received_checksum = self.__data[-1]
-                if received_checksum != checksum:
-                    self.__log.error('Dropping packet: wrong checksum.')
-                    return
-                self.__success = True
+        def _get_length(self, header):
+            return 300
+
+        def _validate(self, frame):
+            checksum = frame[-1]
+            if (self.byte_sum - checksum) & 0xFF != checksum:
+                self.__log.error('Dropping packet: wrong checksum.')
+                return False
+            return True
 
-        @property
-        def success(self):
-            return self.__success
-        
         @property
         def data(self):
-            return self.__data
+            return self.frame[6:] if self.frame is not None else None
 
     def __init__(self, name, config):
         from ...core.singletons import Singletons
@@ -69,41 +47,45 @@ class JkBmsBd(BatteryInterface):
 
         self.__on_data = list()
 
-        self.__device = None
+        self.__device = MicroBleDevice(self.__ble)
+        self.__received = ThreadSafeFlag()
         self.__data = BatteryData(name)
+        self.__decoder = self.MesssageDecoder(self.__log)
         self.__current_decoder = None
 
     async def read_battery(self):
+        if not await self.__device.acquire():
+            return
         characteristic = None
+        success = False
         try:
-            self.__ble.activate()
             self.__data.reset()
 
-            if self.__device is None:
-                self.__device = MicroBleDevice(self.__ble)
+            new_connection = not self.__device.connected
+            if new_connection:
+                self.__ble.activate()
                 await self.__device.connect(self.__mac, 0, timeout=10000)
-            else:
-                await self.__device.reconnect(timeout=10000)
 
             service = await self.__device.service(BT_UUID(0xffe0))
             characteristic = await service.characteristic(BT_UUID(0xffe1))
-            descriptor = await characteristic.descriptor()
 
             characteristic.enable_rx(self.__handle_blob)
 
-            await descriptor.write(unhexlify('0100'))
-            await sleep(0.2)
+            if new_connection:
+                descriptor = await characteristic.descriptor()
+                await descriptor.write(unhexlify('0100'))
+                await sleep(0.2)
             
-            await characteristic.write(unhexlify('aa5590eb9700a397a25553bef1fcf9796b521483'))
+                await characteristic.write(unhexlify('aa5590eb9700a397a25553bef1fcf9796b521483'))
 
-            await sleep(1.0)
+                await sleep(1.0)
 
-            success = await self.__send(characteristic,
-                                         unhexlify('aa5590eb960013e9e22d518e1f56085727a705a1'))
-            if success:
+            if await self.__send(characteristic, unhexlify('aa5590eb960013e9e22d518e1f56085727a705a1')):
                 self.__parse(self.__current_decoder.data)
 
-            if self.__data.valid:
+            # a received frame does not count as success, the connection is only kept for valid data
+            success = self.__data.valid
+            if success:
                 print_battery(self.__log, self.__data)
                 run_callbacks(self.__on_data, self.__data)
             else:
@@ -117,10 +99,11 @@ class JkBmsBd(BatteryInterface):
         finally:
             if characteristic is not None:
                 characteristic.disable_rx()
-            if self.__device is not None:
+            if not (success and self.__device.session):
                 await self.__device.disconnect()
+                self.__ble.deactivate()
+            self.__device.release(success)
             self.__current_decoder = None
-            self.__ble.deactivate()
 
     @property
     def on_battery_data(self):
@@ -134,18 +117,26 @@ class JkBmsBd(BatteryInterface):
     def device_types(self):
         return self.__device_types
 
+    @property
+    def transport(self):
+        return TRANSPORT_BLUETOOTH
+
     def __handle_blob(self, data):
         if self.__current_decoder is not None:
-            self.__current_decoder.read(data)
+            if self.__current_decoder.read(data) is not None:
+                self.__received.set()
 
     async def __send(self, characteristic, data):
         for i in range(5):
-            self.__current_decoder = self.MesssageDecoder(self.__log)
+            self.__decoder.reset()
+            self.__current_decoder = self.__decoder
+            self.__received.clear()
             await characteristic.write(data)
-            for _ in range(100):
-                await sleep(0.1)
-                if self.__current_decoder.success == True:
-                    return True
+            try:
+                await wait_for_ms(self.__received.wait(), _RESPONSE_TIMEOUT)
+                return True
+            except TimeoutError:
+                pass
             self.__log.error('Attempt ', i, ' for command failed.')
         return False
     
@@ -1,14 +1,18 @@
-from asyncio import sleep
+from asyncio import sleep, ThreadSafeFlag, TimeoutError, wait_for_ms
+from micropython import const
 from bluetooth import UUID as BT_UUID
 from ubinascii import unhexlify
 from ..interfaces.batteryinterface import BatteryInterface
 from ...core.devicetools import print_battery
-from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError
+from ...core.microblecentral import MicroBleCentral, MicroBleDevice, MicroBleTimeoutError, TRANSPORT_BLUETOOTH
 from ...core.logging import CustomLogger
 from ...core.types import run_callbacks
 from ...helpers.batterydata import BatteryData
+from ...helpers.frameassembler import FrameAssembler
 from ...helpers.streamreader import read_big_uint8, read_big_uint16, read_big_int16
 
+_RESPONSE_TIMEOUT = const(2000)
+
 # ressources:
 # https://blog.ja-ke.tech/2020/02/07/ltt-power-bms-chinese-protocol.html
 # https://www.lithiumbatterypcb.com/smart-bms-software-download/
@@ -21,10 +25,11 @@ class LltPowerBmsV4Ble(BatteryInterface):
             self.__cells_blob = None
 
         def add(self, decoder):
+            # the decoder buffer is reused for the next command
             if decoder.command == 3:
-                self.__general_blob = decoder.data
+                self.__general_blob = bytes(decoder.data)
             elif decoder.command == 4:
-                self.__cells_blob = decoder.data
+                self.__cells_blob = bytes(decoder.data)
 
         @property
         def complete(self):
@@ -46,63 +51,35 @@ class LltPowerBmsV4Ble(BatteryInterface):
             battery_data.cells = tuple(read_big_uint16(c, i) / 1000 for i in range(0, len(c), 2))
             battery_data.validate()
 
-    class MesssageDecoder:
+    class MesssageDecoder(FrameAssembler):
         def __init__(self, log):
+            super().__init__(263, b'\xdd', 4) # 255 bytes payload, 4 bytes header, 2 bytes checksum, 1 byte end byte
             self.__log = log
-            self.__length = None
-            self.__data = None
-            self.__command = None
-            self.__checksum = 0x10000
-            self.__success = None
-
-        def read(self, blob):
-            if self.__success is not None:
-                return
-            self.__success = False
-            if self.__data is None:
-                if len(blob) < 5: # at least one byte payload
-                    self.__log.error('Dropping unknown packet: too short.')
-                    return
-                if blob[0] != 0xdd:
-                    self.__log.error('Dropping unknown packet: wrong start byte.')
-                    return
-                if blob[2] != 0:
-                    self.__log.error('Dropping packet: error indication.')
-                    return
-                self.__command = read_big_uint8(blob, 1)
-                self.__length = read_big_uint8(blob, 3) + 3 # 2 bytes checksum + 1 byte end byte
-                self.__data = bytearray(blob[4:])
-                for i in range(2, len(blob)):
-                    self.__checksum -= blob[i]
-            else:
-                self.__data += bytearray(blob)
-                for i in range(0, len(blob) - 3):
-                    self.__checksum -= blob[i]
-
-            if len(self.__data) < self.__length: # type: ignore
-                self.__success = None
-            else:
-                received_checksum = read_big_uint16(self.__data, -3)
-                if received_checksum != self.__checksum:
-                    self.__log.error('Dropping packet: wrong checksum.')
-                    return
 
-                if self.__data[-1] != 0x77:
-                    self.__log.error('Dropping packet: wrong end byte.')
-                    return
-                self.__success = True
+        def _get_length(self, header):
+            if header[2] != 0:
+                self.__log.error('Dropping packet: error indication.')
+                return None
+            return header[3] + 7
+
+        def _validate(self, frame):
+            # checksum covers status, length and payload
+            checksum = (0x10000 - (self.byte_sum - frame[0] - frame[1] - frame[-3] - frame[-2] - frame[-1])) & 0xFFFF
+            if read_big_uint16(frame, len(frame) - 3) != checksum:
+                self.__log.error('Dropping packet: wrong checksum.')
+                return False
+            if frame[-1] != 0x77:
+                self.__log.error('Dropping packet: wrong end byte.')
+                return False
+            return True
 
-        @property
-        def success(self):
-            return self.__success
-        
         @property
         def command(self):
-            return self.__command
-        
+            return self.frame[1] if self.frame is not None else None
+
         @property
         def data(self):
-            return memoryview(self.__data)[:-3] if self.__data is not None else None
+            return self.frame[4:-3] if self.frame is not None else None
 
     def __init__(self, name, config):
         from ...core.singletons import Singletons
@@ -116,42 +93,46 @@ class LltPowerBmsV4Ble(BatteryInterface):
 
         self.__on_data = list()
 
-        self.__device = None
+        self.__device = MicroBleDevice(self.__ble)
+        self.__received = ThreadSafeFlag()
         self.__data = BatteryData(name)
         self.__current_bundle = None
+        self.__decoder = self.MesssageDecoder(self.__log)
         self.__current_decoder = None
 
     async def read_battery(self):
+        if not await self.__device.acquire():
+            return
         rx_characteristic = None
+        success = False
         try:
-            self.__ble.activate()
             self.__data.reset()
             self.__current_bundle = self.DataBundle()
 
-            if self.__device is None:
-                self.__device = MicroBleDevice(self.__ble)
+            new_connection = not self.__device.connected
+            if new_connection:
+                self.__ble.activate()
                 await self.__device.connect(self.__mac, 0, timeout=10000)
-            else:
-                await self.__device.reconnect(timeout=10000)
 
             service = await self.__device.service(BT_UUID(0xff00))
             tx_characteristic = await service.characteristic(BT_UUID(0xff02))
             rx_characteristic = await service.characteristic(BT_UUID(0xff01))
-            rx_descriptor = await rx_characteristic.descriptor()
 
             rx_characteristic.enable_rx(self.__handle_blob)
 
-            await rx_descriptor.write(unhexlify('01'), is_request=True)
-            await sleep(1.0)
+            if new_connection:
+                rx_descriptor = await rx_characteristic.descriptor()
+                await rx_descriptor.write(unhexlify('01'), is_request=True)
+                await sleep(1.0)
 
-            success = await self.__send(tx_characteristic, unhexlify('dda50300fffd77'))
-            if success:
+            if await self.__send(tx_characteristic, unhexlify('dda50300fffd77')):
                 self.__current_bundle.add(self.__current_decoder)
-                success = await self.__send(tx_characteristic, unhexlify('dda50400fffc77'))
-                if success:
+                if await self.__send(tx_characteristic, unhexlify('dda50400fffc77')):
                     self.__current_bundle.add(self.__current_decoder)
 
-            if self.__current_bundle.complete:
+            # a received frame does not count as success, the connection is only kept for complete data
+            success = self.__current_bundle.complete
+            if success:
                 self.__current_bundle.parse(self.__data)
                 print_battery(self.__log, self.__data)
                 run_callbacks(self.__on_data, self.__data)
@@ -166,11 +147,12 @@ class LltPowerBmsV4Ble(BatteryInterface):
         finally:
             if rx_characteristic is not None:
                 rx_characteristic.disable_rx()
-            if self.__device is not None:
+            if not (success and self.__device.session):
                 await self.__device.disconnect()
+                self.__ble.deactivate()
+            self.__device.release(success)
             self.__current_decoder = None
             self.__current_bundle = None
-            self.__ble.deactivate()
 
     @property
     def on_battery_data(self):
@@ -184,17 +166,25 @@ class LltPowerBmsV4Ble(BatteryInterface):
     def device_types(self):
         return self.__device_types
 
+    @property
+    def transport(self):
+        return TRANSPORT_BLUETOOTH
+
     def __handle_blob(self, blob):
         if self.__current_decoder is not None:
-            self.__current_decoder.read(blob)
+            if self.__current_decoder.read(blob) is not None:
+                self.__received.set()
 
     async def __send(self, characteristic, data):
         for i in range(5):
-            self.__current_decoder = self.MesssageDecoder(self.__log)
+            self.__decoder.reset()
+            self.__current_decoder = self.__decoder
+            self.__received.clear()
             await characteristic.write(data)
-            for _ in range(20):
-                await sleep(0.1)
-                if self.__current_decoder.success == True:
-                    return True
+            try:
+                await wait_for_ms(self.__received.wait(), _RESPONSE_TIMEOUT)
+                return True
+            except TimeoutError:
+                pass
             self.__log.error('Attempt ', i, ' for command ', data, ' failed.')
         return False
\ No newline at end of file
@@ -0,0 +1,69 @@
+from micropython import const
+from ubinascii import unhexlify
+
+# frame: SOI VER ADR CID1 CID2 LENGTH INFO CHKSUM EOI
+# everything between SOI and EOI is ascii hex encoded, the info section is decoded to binary in one step
+
+_HEX_DIGITS = b'0123456789ABCDEF'
+
+_SOI = const(0x7E)
+_EOI = const(0x0D)
+_VERSION = const(0x20)
+_CID1 = const(0x46)
+
+CID2_ANALOG_VALUE = const(0x42)
+CID2_ALARM_INFO = const(0x44)
+CID2_SYSTEM_PARAMETER = const(0x47)
+CID2_MANAGEMENT_INFO = const(0x92)
+CID2_SERIAL_NUMBER = const(0x93)
+
+def create_request(cid2: int, group: int, slave: int, info: int):
+    # requests with one byte of info, as all requests used here
+    request = bytearray(20)
+    request[0] = _SOI
+    _put_hex(request, 1, _VERSION)
+    _put_hex(request, 3, (group << 4) + slave)
+    _put_hex(request, 5, _CID1)
+    _put_hex(request, 7, cid2)
+    _put_hex(request, 9, _get_length_checksum(2) << 4)
+    _put_hex(request, 11, 2)
+    _put_hex(request, 13, info)
+    checksum = _get_checksum(request, 15)
+    _put_hex(request, 15, checksum >> 8)
+    _put_hex(request, 17, checksum & 0xFF)
+    request[19] = _EOI
+    return request
+
+def decode_response(response: bytes, address: int):
+    # returns the binary info section, raises ValueError for invalid frames
+    if response[0] != _SOI:
+        raise ValueError(f'Invalid frame start: {hex(response[0])}')
+    if response[-1] != _EOI:
+        raise ValueError(f'Invalid frame end: {hex(response[-1])}')
+    view = memoryview(response)
+    header = unhexlify(view[1:13]) # VER ADR CID1 RTN LENGTH
+    if header[1] != address:
+        raise ValueError(f'Invalid client address: {hex(header[1])}')
+    if header[2] != _CID1:
+        raise ValueError(f'Invalid command identifiert: {hex(header[2])}')
+    if header[3] != 0:
+        raise ValueError(f'Invalid return code: {hex(header[3])}')
+    length = ((header[4] & 0xF) << 8) + header[5]
+    if header[4] >> 4 != _get_length_checksum(length):
+        raise ValueError(f'Invalid length checksum: {hex(header[4] >> 4)}')
+    checksum = unhexlify(view[-5:-1])
+    received = (checksum[0] << 8) + checksum[1]
+    if received != _get_checksum(view, len(response) - 5):
+        raise ValueError(f'Invalid checksum: {hex(received)}')
+    return unhexlify(view[13:13 + length])
+
+def _put_hex(buffer: bytearray, index: int, value: int):
+    buffer[index] = _HEX_DIGITS[value >> 4]
+    buffer[index + 1] = _HEX_DIGITS[value & 0xF]
+
+def _get_length_checksum(length: int):
+    return -((length & 0xF) + ((length >> 4) & 0xF) + ((length >> 8) & 0xF)) & 0xF
+
+def _get_checksum(frame, end: int):
+    # everything between SOI and the checksum
+    return -sum(memoryview(frame)[1:end]) & 0xFFFF
@@ -0,0 +1,116 @@
+from asyncio import create_task, Lock
+from micropython import const
+from time import ticks_ms, ticks_diff
+from ...core.busscheduler import PRIORITY_TELEMETRY
+from .pylonlvcodec import create_request, decode_response, CID2_SERIAL_NUMBER
+
+_REFRESH_INTERVAL = const(5000) # ms, reads of other packs within this time are served by the last refresh
+_CACHE_PATH = const('/pylonlv_{}.txt') # per port, one line per pack: address serial
+
+class PylonLvStack:
+    # All packs of one port share a stack: they are discovered in one scan and refreshed in one pass.
+    # Analog values are read from every pack each pass, alarm and management info from one pack per pass.
+    def __init__(self, port, port_id: int):
+        from ...core.singletons import Singletons
+        self.__name = f'pylonlv_{port_id}'
+        self.__log = Singletons.log.create_logger(self.__name)
+        self.__port = port
+        self.__packs = []
+        self.__lock = Lock()
+        self.__last_refresh = None
+        self.__details_index = 0
+        self.__find_task = None
+        self.__cache_path = _CACHE_PATH.format(port_id)
+        self.__cache = self.__load_cache()
+
+    def add(self, pack):
+        self.__packs.append(pack)
+        if self.__find_task is None:
+            # started after all devices are created, so one scan finds all packs
+            self.__find_task = create_task(self.__find_packs())
+
+    async def refresh(self):
+        async with self.__lock:
+            if self.__last_refresh is not None and ticks_diff(ticks_ms(), self.__last_refresh) < _REFRESH_INTERVAL:
+                return
+            packs = tuple(x for x in self.__packs if x.address is not None)
+            if not packs:
+                return
+            details = packs[self.__details_index % len(packs)]
+            self.__details_index += 1
+            for pack in packs:
+                await pack.poll(pack is details)
+            self.__last_refresh = ticks_ms()
+
+    async def __find_packs(self):
+        # packs usually keep their address, so the cached ones are probed before scanning
+        for pack in self.__packs:
+            address = self.__cache.get(pack.serial, None)
+            if address is not None:
+                await self.__probe(address)
+        for _ in range(3): # 3 attempts to mitigate communication errors
+            for slave_id in range(16):
+                if all(x.address is not None for x in self.__packs):
+                    return
+                # protocol spec says slave address begins with 2, battery datasheets says max. 15 slaves
+                # so we need to try the range between 0 and 2 to check for any battery
+                await self.__probe(slave_id)
+        for pack in self.__packs:
+            if pack.address is None:
+                self.__log.error('Battery ', pack.serial, ' not found.')
+
+    async def __probe(self, slave_id: int):
+        response = await self.__port.send(create_request(CID2_SERIAL_NUMBER, 0, slave_id, slave_id), \
+                                          self.__name, PRIORITY_TELEMETRY)
+        serial = self.__read_serial_number_response(response, slave_id)
+        if serial is None:
+            return
+        for pack in self.__packs:
+            if pack.serial == serial:
+                if pack.address is None:
+                    await pack.found(slave_id) # group_id is 0, so we can direct use the slave id
+                    self.__store_cache(serial, slave_id)
+                return
+        self.__log.info('Unknown battery ', serial, ' at address ', hex(slave_id))
+
+    def __read_serial_number_response(self, response, address: int):
+        if response is None:
+            return None
+        try:
+            data = decode_response(response, address)
+        except Exception as e:
+            self.__log.error(f'Invalid response from address={hex(address)}: ', e)
+            return None
+        return bytes(data[1:]).decode('utf-8') # first byte is command info
+
+    def __load_cache(self):
+        cache = {}
+        try:
+            with open(self.__cache_path, 'r') as file:
+                for line in file:
+                    parts = line.rstrip('\n').split(' ', 1)
+                    if len(parts) == 2:
+                        cache[parts[1]] = int(parts[0])
+        except (OSError, ValueError):
+            pass
+        return cache
+
+    def __store_cache(self, serial: str, address: int):
+        if self.__cache.get(serial, None) == address:
+            return
+        self.__cache[serial] = address
+        try:
+            with open(self.__cache_path, 'w') as file:
+                for cached_serial, cached_address in self.__cache.items():
+                    file.write(f'{cached_address} {cached_serial}\n')
+        except Exception as e:
+            self.__log.error('Failed to write address cache: ', e)
+
+_stacks = {}
+
+def get_stack(port, port_id: int):
+    stack = _stacks.get(port_id, None)
+    if stack is None:
+        stack = PylonLvStack(port, port_id)
+        _stacks[port_id] = stack
+    return stack
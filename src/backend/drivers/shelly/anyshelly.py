@@ -1,4 +1,5 @@
 from asyncio import create_task, Event, sleep, TimeoutError, wait_for
+from json import loads
 from micropython import const
 from time import time
 from ..interfaces.chargerinterface import ChargerInterface
@@ -13,7 +14,7 @@ _REFRESH_INTERVAL = const(120)
 _TIMER_INTERVAL = const(300)
 
 class AnyShelly:
-    def __init__(self, user, config, log: CustomLogger):
+    def __init__(self, user, config, log: CustomLogger, mqtt=None):
         from ...core.singletons import Singletons
         self.__user = user
         self._log = log
@@ -39,10 +40,28 @@ class AnyShelly:
 
         self.__on_request = f'relay/{self.__relay_id}?turn=on&timer={_TIMER_INTERVAL}'
         self.__off_request = f'relay/{self.__relay_id}?turn=off'
-        self.__state_request = f'relay/{self.__relay_id}'
-        self.__power_request = f'meter/{self.__relay_id}' if (self.__generation == 1) else f'rpc/Switch.GetStatus?id={self.__relay_id}'
+        if self.__generation == 1:
+            self.__state_request = f'relay/{self.__relay_id}'
+            self.__power_request = f'meter/{self.__relay_id}'
+        else:
+            # gen2 reports relay state and power in one response
+            self.__state_request = f'rpc/Switch.GetStatus?id={self.__relay_id}'
+            self.__power_request = None
+        self.__status_power = None
+
+        # gen2 devices can publish their status via MQTT, which makes polling the power unnecessary
+        self.__push = False
+        topic = config.get('mqtt_topic', None)
+        if topic is not None:
+            if self.__generation == 1:
+                self._log.error('Status notifications are only supported for generation 2 devices.')
+            elif mqtt is None:
+                self._log.error('Status notifications need an MQTT connection.')
+            else:
+                self.__push = True
+                self.__push_task = create_task(mqtt.subscribe(f'{topic}/status/switch:{self.__relay_id}', 0, self.__on_push))
 
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=user.name)
 
     async def switch(self, on):
         self.__shall_on = on
@@ -66,30 +85,60 @@ class AnyShelly:
                 pass
             self.__sync_trigger.clear()
 
-            status = await self.__get_status()
-            if status in (STATUS_ON, STATUS_OFF):
-                await sleep(3)
+            try:
+                status = await self.__get_status()
+                if status in (STATUS_ON, STATUS_OFF) and self.__power_request is not None:
+                    await sleep(3)
 
-            if status == STATUS_SYNCING:
-                await self.__switch(self.__shall_on)
-            else:
-                self.__power = await self.__get_power()
-                self.__power_integral.add(self.__power)
+                if status == STATUS_SYNCING:
+                    await self.__switch(self.__shall_on)
+                elif self.__power_request is not None:
+                    self.__update_power(await self.__get_power())
+                elif self.__status_power is not None:
+                    self.__update_power(self.__status_power)
 
-            if (time() - self.__last_on_command) > _REFRESH_INTERVAL:
-                await self.__switch(self.__shall_on)
+                if (time() - self.__last_on_command) > _REFRESH_INTERVAL:
+                    await self.__switch(self.__shall_on)
 
-            if status == STATUS_SYNCING: # prevent reporting status change to SYNCING when relay switches fast
-                await sleep(1)
-                status = await self.__get_status()
+                if status == STATUS_SYNCING: # prevent reporting status change to SYNCING when relay switches fast
+                    await sleep(1)
+                    status = await self.__get_status()
 
-            if status not in (STATUS_ON, STATUS_OFF): # retry setting the switch faster
+                if status not in (STATUS_ON, STATUS_OFF): # retry setting the switch faster
+                    self.__sync_trigger.set()
+
+                self.__update_status(status)
+            except Exception as e:
+                self._log.error('Sync cycle failed: ', e)
+                self._log.trace(e)
+
+    def __on_push(self, topic, payload):
+        try:
+            json = loads(payload)
+            power = json.get('apower', None)
+            if power is not None:
+                self.__update_power(round(float(power)))
+            on = json.get('output', None)
+            if on is None:
+                return
+            status = self.__to_status(on)
+            if status == STATUS_SYNCING:
                 self.__sync_trigger.set()
+            else:
+                self.__update_status(status)
+        except Exception as e:
+            self._log.error('Invalid status notification: ', e)
+            self._log.trace(e)
+
+    def __update_power(self, power: int):
+        self.__power = power
+        self.__power_integral.add(power)
 
-            if status != self.__last_status:
-                self.__last_status = status
-                self._log.info('Status=', status)
-                run_callbacks(self.__on_data, self.__user, {MEASUREMENT_STATUS: status})
+    def __update_status(self, status):
+        if status != self.__last_status:
+            self.__last_status = status
+            self._log.info('Status=', status)
+            run_callbacks(self.__on_data, self.__user, {MEASUREMENT_STATUS: status})
 
     def __on_trigger(self, trigger_type):
         try:
@@ -108,7 +157,7 @@ class AnyShelly:
                 self._log.info('Power=', self.__power, 'W')
             if data:
                 run_callbacks(self.__on_data, self.__user, data)
-            if self.__last_status == STATUS_ON:
+            if self.__last_status == STATUS_ON and not self.__push:
                 self.__sync_trigger.set()
         except Exception as e:
             self._log.error('Trigger cycle failed: ', e)
@@ -123,11 +172,18 @@ class AnyShelly:
             await self.__get(self.__off_request)
 
     async def __get_status(self):
+        self.__status_power = None
         json = await self.__get(self.__state_request)
-        on = json['ison'] if json is not None else None
-        if on is None:
+        if json is None:
             return STATUS_OFFLINE
-        elif on and self.__shall_on:
+        if self.__generation == 1:
+            return self.__to_status(json['ison'])
+        power = json.get('apower', None) # not available for switches without power metering
+        self.__status_power = round(float(power)) if power is not None else None
+        return self.__to_status(json['output'])
+
+    def __to_status(self, on: bool):
+        if on and self.__shall_on:
             return STATUS_ON
         elif not on and not self.__shall_on:
             return STATUS_OFF
@@ -136,8 +192,7 @@ class AnyShelly:
 
     async def __get_power(self):
         json = await self.__get(self.__power_request)
-        key = 'power' if self.__generation == 1 else 'apower'
-        power = float(json[key]) if json is not None else None
+        power = float(json['power']) if json is not None else None
         if power is None:
             self._log.error(f'No power data available.')
             return 0
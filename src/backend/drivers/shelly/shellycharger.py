@@ -4,13 +4,13 @@ from ...core.types import TYPE_CHARGER
 from .anyshelly import AnyShelly
 
 class ShellyCharger(ChargerInterface):
-    def __init__(self, name, config):
+    def __init__(self, name, config, mqtt=None):
         super(ShellyCharger, self).__init__()
         from ...core.singletons import Singletons
         self.__name = name
         self.__device_types = (TYPE_CHARGER,)
         self.__log: CustomLogger = Singletons.log.create_logger(name)
-        self.__driver = AnyShelly(self, config, self.__log)
+        self.__driver = AnyShelly(self, config, self.__log, mqtt)
 
     @property
     def name(self):
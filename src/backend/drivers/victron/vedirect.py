@@ -0,0 +1,188 @@
+from micropython import const
+
+# VE.Direct protocol as published by Victron
+# text protocol: blocks of "\r\n<label>\t<value>" records, closed by a "Checksum" record whose value byte makes
+# the sum of all bytes of the block 0 (mod 256)
+# HEX protocol: ":<command nibble><ascii hex bytes><checksum>\n", the sum of command and all bytes is 0x55
+
+_HEX_DIGITS = b'0123456789ABCDEF'
+
+_STATE_IDLE = const(0)
+_STATE_NAME = const(1)
+_STATE_VALUE = const(2)
+_STATE_CHECKSUM = const(3)
+_STATE_HEX = const(4)
+
+_HASH_MASK = const(0xFFFFFF)
+_HEX_BUFFER_SIZE = const(64)
+
+HEX_GET = const(0x7)
+HEX_SET = const(0x8)
+HEX_ASYNC = const(0xA)
+
+HEX_REGISTER_DEVICE_MODE = const(0x0200) # un8, 1 = on, 4 = off
+HEX_REGISTER_DEVICE_STATE = const(0x0201) # un8, same values as CS
+HEX_REGISTER_PANEL_POWER = const(0xEDBC) # un32, 0.01 W
+HEX_REGISTER_YIELD_TODAY = const(0xEDD3) # un16, 0.01 kWh
+
+def label_hash(label) -> int:
+    value = 0
+    for c in label:
+        value = (value * 33 + c) & _HASH_MASK
+    return value
+
+_CHECKSUM_HASH = label_hash(b'Checksum')
+
+class VeDirectParser:
+    # Parses the received stream byte by byte without allocations.
+    # Values of the requested labels are collected per block and only handed out after the block checksum
+    # was verified, so a corrupted record can not inject a value. Values which are no decimal integers are None.
+    # HEX frames can be interleaved with the text protocol at any time, they are handed out separately.
+    def __init__(self, labels: tuple, on_block, on_hex=None):
+        self.__fields = {label_hash(x): i for i, x in enumerate(labels)}
+        self.__values = [None] * len(labels)
+        self.__on_block = on_block
+        self.__on_hex = on_hex
+        self.__state = _STATE_IDLE
+        self.__saved_state = _STATE_IDLE
+        self.__checksum = 0
+        self.__hash = 0
+        self.__field = -1
+        self.__value = 0
+        self.__sign = 1
+        self.__digits = 0
+        self.__hex = bytearray(_HEX_BUFFER_SIZE)
+        self.__hex_view = memoryview(self.__hex)
+        self.__hex_length = 0
+        self.blocks = 0
+        self.errors = 0
+
+    def feed(self, data):
+        for c in data:
+            state = self.__state
+            if state == _STATE_HEX:
+                self.__feed_hex(c)
+                continue
+            if c == 58 and state != _STATE_CHECKSUM: # ':' starts a HEX frame, it is not part of the checksum
+                self.__saved_state = state
+                self.__state = _STATE_HEX
+                self.__hex_length = 0
+                continue
+            self.__checksum = (self.__checksum + c) & 0xFF
+            if state == _STATE_IDLE:
+                if c == 10: # '\n', a record begins
+                    self.__hash = 0
+                    self.__state = _STATE_NAME
+            elif state == _STATE_NAME:
+                if c == 9: # '\t'
+                    if self.__hash == _CHECKSUM_HASH:
+                        self.__state = _STATE_CHECKSUM
+                    else:
+                        self.__field = self.__fields.get(self.__hash, -1)
+                        self.__value = 0
+                        self.__sign = 1
+                        self.__digits = 0
+                        self.__state = _STATE_VALUE
+                else:
+                    self.__hash = (self.__hash * 33 + c) & _HASH_MASK
+            elif state == _STATE_VALUE:
+                if c == 13: # '\r'
+                    if self.__field >= 0:
+                        self.__values[self.__field] = self.__sign * self.__value if self.__digits > 0 else None
+                    self.__state = _STATE_IDLE
+                elif self.__field >= 0 and self.__digits >= 0:
+                    digit = c - 48
+                    if 0 <= digit <= 9:
+                        self.__value = self.__value * 10 + digit
+                        self.__digits += 1
+                    elif c == 45 and self.__digits == 0 and self.__sign == 1: # '-'
+                        self.__sign = -1
+                    else:
+                        self.__digits = -1 # not a number
+            else: # _STATE_CHECKSUM, c is the checksum byte
+                if self.__checksum == 0:
+                    self.blocks += 1
+                    self.__on_block(self.__values)
+                else:
+                    self.errors += 1
+                for i in range(len(self.__values)):
+                    self.__values[i] = None
+                self.__checksum = 0
+                self.__state = _STATE_IDLE
+
+    def __feed_hex(self, c: int):
+        if c == 10: # '\n'
+            self.__state = self.__saved_state
+            length = self.__hex_length
+            if length > 0 and self.__hex[length - 1] == 13:
+                length -= 1
+            if self.__on_hex is not None:
+                self.__on_hex(self.__hex_view[:length])
+        elif self.__hex_length < _HEX_BUFFER_SIZE:
+            self.__hex[self.__hex_length] = c
+            self.__hex_length += 1
+        else: # no valid HEX frame, resume the text protocol
+            self.__state = self.__saved_state
+
+def create_hex_request(command: int, register: int, value: int = 0, size: int = 0):
+    # Get and Set requests, size is the number of value bytes
+    request = bytearray(11 + 2 * size)
+    request[0] = 58 # ':'
+    request[1] = _HEX_DIGITS[command]
+    checksum = 0x55 - command
+    index = 2
+    for byte in (register & 0xFF, register >> 8, 0): # register id little endian, flags
+        _put_hex(request, index, byte)
+        checksum -= byte
+        index += 2
+    for _ in range(size): # value little endian
+        byte = value & 0xFF
+        _put_hex(request, index, byte)
+        checksum -= byte
+        value >>= 8
+        index += 2
+    _put_hex(request, index, checksum & 0xFF)
+    request[index + 2] = 10 # '\n'
+    return request
+
+def parse_hex_response(frame):
+    # frame without ':' and '\n', returns (command, register, flags, value) or None for invalid frames
+    length = len(frame)
+    if length < 9 or not length & 1:
+        return None
+    command = _get_hex(frame[0])
+    if command < 0:
+        return None
+    checksum = command
+    register = 0
+    flags = 0
+    value = 0
+    for i in range((length - 1) // 2):
+        high = _get_hex(frame[1 + 2 * i])
+        low = _get_hex(frame[2 + 2 * i])
+        if high < 0 or low < 0:
+            return None
+        byte = (high << 4) + low
+        checksum += byte
+        if i < 2:
+            register += byte << (8 * i)
+        elif i == 2:
+            flags = byte
+        elif 2 * i < length - 3: # last byte is the checksum
+            value += byte << (8 * (i - 3))
+    if checksum & 0xFF != 0x55:
+        return None
+    return command, register, flags, value
+
+def _put_hex(buffer: bytearray, index: int, value: int):
+    buffer[index] = _HEX_DIGITS[value >> 4]
+    buffer[index + 1] = _HEX_DIGITS[value & 0xF]
+
+def _get_hex(c: int):
+    if 48 <= c <= 57:
+        return c - 48
+    if 65 <= c <= 70:
+        return c - 55
+    if 97 <= c <= 102:
+        return c - 87
+    return -1
@@ -1,14 +1,23 @@
-from asyncio import create_task, Event
-from collections import deque
+from asyncio import create_task, sleep_ms
 from machine import Pin
+from micropython import const
 from ..interfaces.solarinterface import SolarInterface
 from ...core.addonserial import AddOnSerial
 from ...core.triggers import TRIGGER_300S, triggers
 from ...core.types import to_port_id, run_callbacks, STATUS_ON, STATUS_OFF, STATUS_SYNCING
 from ...core.types import MEASUREMENT_STATUS, MEASUREMENT_POWER, MEASUREMENT_ENERGY
 from ...helpers.valueaggregator import ValueAggregator
+from .vedirect import VeDirectParser, create_hex_request, parse_hex_response
+from .vedirect import HEX_GET, HEX_SET, HEX_ASYNC
+from .vedirect import HEX_REGISTER_DEVICE_MODE, HEX_REGISTER_DEVICE_STATE, HEX_REGISTER_PANEL_POWER, HEX_REGISTER_YIELD_TODAY
 
 _OFF_STATES = const((3,4,5,7,247))
+_LABELS = (b'PPV', b'CS', b'H20')
+
+_HEX_DETAILS_INTERVAL = const(10) # device state and yield are requested with every 10th power request
+_HEX_REQUEST_GAP = const(20) # ms between requests, the charger handles one request at a time
+_DEVICE_MODE_ON = const(1)
+_DEVICE_MODE_OFF = const(4)
 
 class VictronMppt(SolarInterface):
     def __init__(self, name, config):
@@ -22,16 +31,23 @@ class VictronMppt(SolarInterface):
         if Singletons.ports[port_id] is not None:
             raise Exception('Port ', port, 'is already in use')
         
+        self.__parser = VeDirectParser(_LABELS, self.__on_block, self.__on_hex)
         self.__port = AddOnSerial(port_id)
-        self.__port.set_mode(line=True)
+        self.__port.set_mode(line=False)
         self.__port.connect(19200, 0, None, 1)
         self.__port.on_rx.append(self.__on_rx)
-        self.__rx_buffer = deque(tuple(), 256)
-        self.__rx_trigger = Event()
-        self.__rx_task = create_task(self.__receive())
 
-        self.__control_pin = Pin(4, Pin.OUT)
-        self.__control_pin.off()
+        # with the HEX protocol, the TX line is needed for requests, so the charger is switched by a HEX command
+        hex_interval = config.get('hex_interval', None)
+        self.__control_pin = None
+        if hex_interval is None:
+            self.__control_pin = Pin(4, Pin.OUT)
+            self.__control_pin.off()
+        else:
+            self.__power_request = create_hex_request(HEX_GET, HEX_REGISTER_PANEL_POWER)
+            self.__state_request = create_hex_request(HEX_GET, HEX_REGISTER_DEVICE_STATE)
+            self.__yield_request = create_hex_request(HEX_GET, HEX_REGISTER_YIELD_TODAY)
+            self.__hex_task = create_task(self.__poll_hex(max(_HEX_REQUEST_GAP * 3, int(hex_interval))))
 
         self.__power_avg = ValueAggregator()
         self.__power = 0
@@ -41,11 +57,15 @@ class VictronMppt(SolarInterface):
 
         self.__on_data = []
 
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=name)
 
 
     async def switch_solar(self, on):
-        self.__control_pin.value(on)
+        if self.__control_pin is not None:
+            self.__control_pin.value(on)
+        else:
+            self.__port.send(create_hex_request(HEX_SET, HEX_REGISTER_DEVICE_MODE, \
+                                                _DEVICE_MODE_ON if on else _DEVICE_MODE_OFF, 1))
 
     @property
     def on_solar_data(self):
@@ -70,6 +90,9 @@ class VictronMppt(SolarInterface):
             power = round(self.__power_avg.average(clear_afterwards=True))
             data = {}
             if trigger_type == TRIGGER_300S:
+                self.__log.info('Blocks=', self.__parser.blocks, ' checksum errors=', self.__parser.errors)
+                self.__parser.blocks = 0
+                self.__parser.errors = 0
                 data[MEASUREMENT_STATUS] = self.__last_status
                 data[MEASUREMENT_POWER] = power
                 data[MEASUREMENT_ENERGY] = self.__get_energy()
@@ -84,8 +107,8 @@ class VictronMppt(SolarInterface):
             self.__log.trace(e)
     
     def __on_rx(self, data):
-        self.__rx_buffer.append(data)
-        self.__rx_trigger.set()
+        # data is a view into the receive buffer of the port, only valid during this call
+        self.__parser.feed(data)
 
     def __get_energy(self):
         energy = self.__energy_delta
@@ -93,38 +116,59 @@ class VictronMppt(SolarInterface):
         self.__log.info(energy, ' Wh fed after last check')
         return energy
 
-    async def __receive(self):
+    def __on_block(self, values):
+        power, status, energy = values
+        if power is not None:
+            self.__power_avg.add(power)
+        if status is not None:
+            self.__update_status(status)
+        if energy is not None:
+            self.__update_energy(energy * 10)
+
+    def __on_hex(self, frame):
+        response = parse_hex_response(frame)
+        if response is None:
+            self.__log.error('Invalid HEX frame received: ', bytes(frame))
+            return
+        command, register, flags, value = response
+        if command not in (HEX_GET, HEX_ASYNC) or flags != 0:
+            return
+        if register == HEX_REGISTER_PANEL_POWER:
+            self.__power_avg.add(value // 100)
+        elif register == HEX_REGISTER_DEVICE_STATE:
+            self.__update_status(value)
+        elif register == HEX_REGISTER_YIELD_TODAY:
+            self.__update_energy(value * 10)
+
+    async def __poll_hex(self, interval: int):
+        # the charger pauses the text protocol while HEX requests are received
+        count = 0
         while True:
-            while self.__rx_buffer:
-                line = self.__rx_buffer.popleft()
-                if len(line) > 4: # 1 start 1 tab 1 value 1 newline
-                    end = len(line)
-                    while line[end - 1] <= 32: # find trailing whitespace characters
-                        end -= 1
-                    self.__parse(line, end)
-
-            await self.__rx_trigger.wait()
-            self.__rx_trigger.clear()
-
-    def __parse(self, line: bytes, end: int):
-        try:
-            if line[0] == 80 and line[1] == 80 and line[2] == 86 and line[3] == 9: # PPV
-                power = int(str(line[4:end], 'utf-8'))
-                self.__power_avg.add(power)
-            elif line[0] == 67 and line[1] == 83 and line[2]  == 9: # CS
-                status = STATUS_ON if int(str(line[3:end], 'utf-8')) in _OFF_STATES else STATUS_OFF
-                if status != self.__last_status:
-                    self.__last_status = status
-                    self.__log.info('Status: ', status)
-                    run_callbacks(self.__on_data, self, {MEASUREMENT_STATUS: status})
-            elif line[0] == 72 and line[1] == 50 and line[2] == 48 and line[3] == 9: # H20
-                energy = int(str(line[4:end], 'utf-8')) * 10
-                if self.__energy_value is None: # first readout after startup
-                    pass
-                elif self.__energy_value > energy: # end of the day or begin of a new day
-                    self.__energy_delta += energy
-                else:
-                    self.__energy_delta += energy - self.__energy_value
-                self.__energy_value = energy
-        except:
-            self.__log.error('Invalid packet received: ', line)
+            try:
+                self.__port.send(self.__power_request)
+                if count % _HEX_DETAILS_INTERVAL == 0:
+                    await sleep_ms(_HEX_REQUEST_GAP)
+                    self.__port.send(self.__state_request)
+                    await sleep_ms(_HEX_REQUEST_GAP)
+                    self.__port.send(self.__yield_request)
+                count += 1
+            except Exception as e:
+                self.__log.error('HEX request failed: ', e)
+                self.__log.trace(e)
+            await sleep_ms(interval)
+
+    def __update_status(self, state: int):
+        status = STATUS_ON if state in _OFF_STATES else STATUS_OFF
+        if status != self.__last_status:
+            self.__last_status = status
+            self.__log.info('Status: ', status)
+            run_callbacks(self.__on_data, self, {MEASUREMENT_STATUS: status})
+
+    def __update_energy(self, energy: int):
+        if self.__energy_value is None: # first readout after startup
+            pass
+        elif self.__energy_value > energy: # end of the day or begin of a new day
+            self.__energy_delta += energy
+        else:
+            self.__energy_delta += energy - self.__energy_value
+        self.__energy_value = energy
@@ -0,0 +1,42 @@
+from array import array
+
+# Modbus CRC16 (polynomial 0xA001 reflected, initial value 0xFFFF)
+
+def _build_table():
+    table = array('H', bytes(512))
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table[i] = crc
+    return table
+
+_TABLE = _build_table()
+
+def _crc16_python(data, length: int, table) -> int:
+    crc = 0xFFFF
+    for i in range(length):
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+    return crc
+
+try:
+    import micropython
+
+    @micropython.viper
+    def _crc16_viper(data: ptr8, length: int, table: ptr16) -> int:
+        crc = 0xFFFF
+        for i in range(length):
+            crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+        return crc
+
+    _crc16 = _crc16_viper
+except (ImportError, AttributeError, SyntaxError):
+    # host python for tests
+    _crc16 = _crc16_python
+
+def crc16(data, length: int) -> int:
+    # data can be any buffer, only the first length bytes are used
+    return _crc16(data, length, _TABLE)
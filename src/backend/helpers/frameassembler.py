@@ -0,0 +1,85 @@
+class FrameAssembler:
+    # Collects a frame arriving in several chunks in a preallocated buffer.
+    # Subclasses provide the framing rules: _get_length reads the total frame length from the header
+    # (None drops the frame), _validate checks the complete frame.
+    # The sum of all frame bytes is accumulated while receiving, so checksums only need a correction at the end.
+    def __init__(self, capacity: int, marker: bytes, header_length: int):
+        self.__buffer = bytearray(capacity)
+        self.__view = memoryview(self.__buffer)
+        self.__marker = marker
+        self.__header_length = max(header_length, len(marker))
+        self.reset()
+
+    def reset(self):
+        self.__count = 0
+        self.__length = None
+        self.__frame = None
+        self.byte_sum = 0
+
+    @property
+    def frame(self):
+        return self.__frame
+
+    def read(self, blob: bytes):
+        # returns the complete and valid frame as memoryview, None while the frame is incomplete
+        if self.__frame is not None:
+            return self.__frame
+        source = memoryview(blob)
+        size = len(blob)
+        offset = 0
+        while offset < size:
+            start = -1
+            if self.__count == 0:
+                start = blob.find(self.__marker, offset)
+                if start < 0:
+                    return None
+                offset = start
+
+            target = self.__length if self.__length is not None else self.__header_length
+            end = min(size, offset + target - self.__count)
+            self.__view[self.__count:self.__count + end - offset] = source[offset:end]
+            byte_sum = self.byte_sum
+            for i in range(offset, end):
+                byte_sum += blob[i]
+            self.byte_sum = byte_sum
+            self.__count += end - offset
+            offset = end
+            if self.__count < target:
+                return None
+
+            if self.__length is None:
+                length = self._get_length(self.__view)
+                if length is None or length < self.__header_length or length > len(self.__buffer):
+                    offset = self.__resync(start, offset)
+                    if self.__frame is not None:
+                        return self.__frame
+                    continue
+                self.__length = length
+                if length > self.__count:
+                    continue
+
+            frame = self.__view[:self.__length]
+            if self._validate(frame):
+                self.__frame = frame
+                return frame
+            offset = self.__resync(start, offset)
+            if self.__frame is not None:
+                return self.__frame
+        return None
+
+    def __resync(self, start: int, offset: int):
+        # a broken frame is dropped, searching for the next marker right after its start
+        if start >= 0: # the frame began in the current chunk, all its bytes are still in there
+            self.reset()
+            return start + 1
+        # the frame began in an earlier chunk, its buffered bytes may already contain the next frame
+        tail = bytes(self.__view[1:self.__count])
+        self.reset()
+        self.read(tail)
+        return offset
+
+    def _get_length(self, header: memoryview):
+        raise NotImplementedError()
+
+    def _validate(self, frame: memoryview):
+        raise NotImplementedError()
@@ -0,0 +1,73 @@
+class SlidingWindow:
+    # Ring buffer of (timestamp, value) in arrival order plus the same values kept sorted.
+    # Timestamps must be appended in ascending order, so the oldest item is always at the head.
+    def __init__(self, capacity: int):
+        self.__capacity = capacity
+        self.__timestamps = [0] * capacity
+        self.__values = [0] * capacity
+        self.__sorted = []
+        self.clear()
+
+    def __len__(self):
+        return self.__count
+
+    def clear(self):
+        self.__head = 0
+        self.__count = 0
+        self.__sum = 0
+        self.__sorted.clear()
+
+    def append(self, timestamp: int, value: int):
+        if self.__count == self.__capacity:
+            self.popleft()
+        index = (self.__head + self.__count) % self.__capacity
+        self.__timestamps[index] = timestamp
+        self.__values[index] = value
+        self.__count += 1
+        self.__sum += value
+        self.__sorted.insert(_bisect(self.__sorted, value), value)
+
+    def popleft(self):
+        value = self.__values[self.__head]
+        self.__head = (self.__head + 1) % self.__capacity
+        self.__count -= 1
+        self.__sum -= value
+        self.__sorted.pop(_bisect(self.__sorted, value) - 1)
+
+    def trim(self, expired_timestamp: int):
+        while self.__count > 0 and self.__timestamps[self.__head] <= expired_timestamp:
+            self.popleft()
+
+    @property
+    def oldest_timestamp(self):
+        return self.__timestamps[self.__head] if self.__count > 0 else None
+
+    def nth_smallest(self, n: int):
+        return self.__sorted[n] if n < self.__count else None
+
+    def percentile(self, percent: int):
+        if self.__count == 0:
+            return None
+        return self.__sorted[min(self.__count - 1, (self.__count * percent) // 100)]
+
+    def trimmed_mean(self, percent: int):
+        trimmed = (self.__count * percent) // 100
+        remaining = self.__count - 2 * trimmed
+        if remaining <= 0:
+            return None
+        total = self.__sum
+        for i in range(trimmed):
+            total -= self.__sorted[i] + self.__sorted[-1 - i]
+        return round(total / remaining)
+
+def _bisect(values: list, value):
+    # returns the index after the last entry <= value
+    low = 0
+    high = len(values)
+    while low < high:
+        middle = (low + high) // 2
+        if value < values[middle]:
+            high = middle
+        else:
+            low = middle + 1
+    return low
@@ -20,6 +20,17 @@ class BigEndianSteamReader:
     
     def uint16_at(self, index: int):
         return (self.__data[index] << 8) + self.__data[index + 1]
+
+    def int16(self):
+        value = self.uint16()
+        if value > 0x7FFF:
+            value -= 0xFFFF
+        return value
+
+    def uint24(self):
+        value = (self.__data[self.__index] << 16) + (self.__data[self.__index + 1] << 8) + self.__data[self.__index + 2]
+        self.__index += 3
+        return value
     
 def read_big_uint8(data: bytes, index: int):
     return data[index]
@@ -62,34 +73,3 @@ def read_little_int32(data: bytes, index: int):
     if value > 0x7FFFFFFF:
         value -= 0xFFFFFFFF
     return value
-
-class AsciiHexStreamReader:
-    def __init__(self, data: bytes, offset: int):
-        self.__data = data
-        self.__index = offset
-
-    def read_uint8(self):
-        new_index = self.__index + 2
-        value = int(self.__data[self.__index:new_index].decode('utf-8'), 16)
-        self.__index = new_index
-        return value
-    
-    def read_uint16(self):
-        new_index = self.__index + 4
-        value = int(self.__data[self.__index:new_index].decode('utf-8'), 16)
-        self.__index = new_index
-        return value
-    
-    def read_int16(self):
-        new_index = self.__index + 4
-        value = int(self.__data[self.__index:new_index].decode('utf-8'), 16)
-        self.__index = new_index
-        if value > 0x7FFF:
-            value -= 0xFFFF
-        return value
-    
-    def read_uint24(self):
-        new_index = self.__index + 6
-        value = int(self.__data[self.__index:new_index].decode('utf-8'), 16)
-        self.__index = new_index
-        return value
\ No newline at end of file
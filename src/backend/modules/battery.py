@@ -1,25 +1,32 @@
-from asyncio import sleep
-from random import randrange
+from asyncio import gather, sleep
+from micropython import const
 from time import time
 from ..core.types import run_callbacks
 from .devices import Devices
 
+_DEFAULT_FRESHNESS = const(60)
+_RETRY_INTERVAL = const(5)
+
 class Battery:
     class BatteryBundle:
-            def __init__(self, battery):
-                self.online = True
+            def __init__(self, battery, freshness):
                 self.battery = battery
+                self.freshness = freshness
+                self.last_attempt = 0
 
 
     def __init__(self, config: dict, devices: Devices):
         self.__on_battery_data = list()
 
         self.__battery_data = dict()
+        self.__bundles = list()
         from ..core.types import TYPE_BATTERY
         self.__batteries = devices.get_by_type(TYPE_BATTERY)
         for battery in self.__batteries:
             self.__battery_data[battery.name] = None
             battery.on_battery_data.append(self.__on_device_data)
+            freshness = int(config['devices'][battery.name].get('freshness', _DEFAULT_FRESHNESS))
+            self.__bundles.append(self.BatteryBundle(battery, freshness))
 
     async def run(self):
         from ..core.singletons import Singletons
@@ -27,13 +34,36 @@ class Battery:
             Singletons.log.send('battery', 'No batteries found.')
             return
 
+        # batteries on different transports are read in parallel, batteries sharing a transport one after another
+        transports = dict()
+        for bundle in self.__bundles:
+            transports.setdefault(bundle.battery.transport, []).append(bundle)
+        await gather(*(self.__poll_transport(x) for x in transports.values()))
+
+    async def __poll_transport(self, bundles):
+        from ..core.singletons import Singletons
         while True:
             now = time()
-            for device in self.__batteries:
-                data = self.__battery_data[device.name]
-                if data is None or data.timestamp + 60 < now:
-                    await device.read_battery()
-            await sleep(randrange(2, 5, 1))
+            next_bundle = None
+            next_poll = None
+            for bundle in bundles:
+                poll = self.__get_next_poll(bundle)
+                if next_poll is None or poll < next_poll:
+                    next_bundle = bundle
+                    next_poll = poll
+            if next_poll > now:
+                await sleep(next_poll - now)
+                continue
+            next_bundle.last_attempt = now
+            try:
+                await next_bundle.battery.read_battery()
+            except Exception as e:
+                Singletons.log.send('battery', 'Reading ', next_bundle.battery.name, ' failed: ', e)
+
+    def __get_next_poll(self, bundle: BatteryBundle):
+        data = self.__battery_data[bundle.battery.name]
+        timestamp = data.timestamp if data is not None else 0
+        return max(timestamp + bundle.freshness, bundle.last_attempt + _RETRY_INTERVAL)
 
     def __on_device_data(self, data):
         self.__battery_data[data.name] = data
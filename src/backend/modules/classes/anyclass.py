@@ -2,14 +2,17 @@ from asyncio import Lock, TimeoutError, wait_for
 from ...core.devicetools import merge_driver_statuses
 from ...core.logging import CustomLogger
 from ...core.triggers import triggers, TRIGGER_300S
-from ...core.types import CommandFiFo, run_callbacks, STATUS_OFF, STATUS_OFFLINE, MEASUREMENT_STATUS, MEASUREMENT_ENERGY, MEASUREMENT_POWER
+from ...core.types import CommandQueue, run_callbacks, STATUS_OFF, STATUS_OFFLINE, MEASUREMENT_STATUS, MEASUREMENT_ENERGY, MEASUREMENT_POWER
 from ..devices import Devices
 
 class AnyClass:
     def __init__(self, class_name: str, devices: Devices, data_event, data_getter):
         from ...core.singletons import Singletons
         self._lock = Lock()
-        self._commands = CommandFiFo(16)
+        self._commands = CommandQueue()
+        # commands are bound once, the queue compares them by identity
+        self.__get_status_command = self._get_status
+        self.__get_power_command = self._get_power
 
         self._log: CustomLogger = Singletons.log.create_logger(class_name)
 
@@ -24,14 +27,17 @@ class AnyClass:
         for device in self._devices:
             data_event(device).append(self.__on_device_data)
 
-        triggers.add_subscriber(self.__on_trigger)
+        triggers.add_subscriber(self.__on_trigger, name=class_name)
 
     async def run(self):
         while True:
             try:
                 async with self._lock:
-                    while self._commands:
+                    while len(self._commands) > 0:
                         await self._commands.popleft()()
+                if self._commands.dropped > 0:
+                    self._log.error('Dropped ', self._commands.dropped, ' commands')
+                    self._commands.dropped = 0
             except Exception as e:
                 self._log.error('Cycle failed: ', e)
                 self._log.trace(e)
@@ -77,8 +83,8 @@ class AnyClass:
 
     def __on_device_data(self, sender, data):
         if MEASUREMENT_STATUS in data:
-            self._commands.append(self._get_status)
+            self._commands.append(self.__get_status_command)
         if MEASUREMENT_POWER in data:
-            self._commands.append(self._get_power)
+            self._commands.append(self.__get_power_command)
         if MEASUREMENT_ENERGY in data:
             run_callbacks(self._summary_callbacks, {MEASUREMENT_ENERGY: data[MEASUREMENT_ENERGY]})
@@ -13,6 +13,7 @@ class Heater(AnyClass):
         super().__init__(TYPE_HEATER, devices, lambda x: x.on_heater_data, lambda x: x.get_heater_data())
 
         self.__battery = battery
+        self.__evaluate_command = self._evaluate
 
         self.__temps = {
             TYPE_BATTERY: _MAGIC_NONE
@@ -78,4 +79,4 @@ class Heater(AnyClass):
             if battery and battery.temps:
                 min_temp = min(min_temp, min(battery.temps))
         self.__temps[TYPE_BATTERY] = min_temp
-        self._commands.append(self._evaluate)
+        self._commands.append(self.__evaluate_command)
@@ -11,6 +11,9 @@ class Inverter(AnyClass):
     def __init__(self, config: dict, devices: Devices, consumption: Consumption):
         super().__init__(TYPE_INVERTER, devices, lambda x: x.on_inverter_data, lambda x: x.get_inverter_data())
 
+        self.__handle_state_change_command = self._handle_state_change
+        self.__update_netzero_command = self._update_netzero
+
         config = config['inverter']
         self.__default_power = int(config['power'])
         self.__reduce_power_during_fault = bool(config['reduce_power_during_fault'])
@@ -24,6 +27,7 @@ class Inverter(AnyClass):
     async def set_mode(self, mode: str):
         async with self._lock:
             shall_on = (mode == MODE_DISCHARGE)
+            # drivers only store the new target, the commands are sent by their own tasks
             for inverter in self._devices:
                 await inverter.switch_inverter(shall_on)
 
@@ -32,7 +36,7 @@ class Inverter(AnyClass):
         status = merge_driver_statuses(driver_statuses)
 
         if status != self._last_status :
-            self._commands.append(self._handle_state_change)
+            self._commands.append_priority(self.__handle_state_change_command)
             if status != STATUS_ON:
                 run_callbacks(self._summary_callbacks, {MEASUREMENT_POWER: 0})
                 if self.__netzero is not None:
@@ -56,7 +60,7 @@ class Inverter(AnyClass):
         power = await self._get_power()
         if status != STATUS_ON or power is None:
             return
-        delta = self.__netzero.evaluate() # type: ignore
+        delta = self.__netzero.evaluate(power) # type: ignore
         if delta != 0:
             await self.__set_power(power + delta)
 
@@ -70,7 +74,7 @@ class Inverter(AnyClass):
 
         if power != self._last_power:
             if self.__netzero is not None:
-                self.__netzero.clear()
+                self.__netzero.on_power_change()
         if power != self._last_power:
             run_callbacks(self._summary_callbacks, {MEASUREMENT_POWER: power})
             self._last_power = power
@@ -92,5 +96,5 @@ class Inverter(AnyClass):
 
     def __on_live_consumption(self, power):
         if self._last_status == STATUS_ON:
-            self.__netzero.update(time(), power) # type: ignore
-        self._commands.append(self._update_netzero)
+            self.__netzero.update(time(), power, self._last_power) # type: ignore
+        self._commands.append(self.__update_netzero_command)
@@ -80,11 +80,11 @@ class Devices:
             elif driver_name == _SHELLY_CHARGER:
                 from ..drivers.shelly.shellycharger import ShellyCharger
                 gc_collect()
-                self.__load_device(name, ShellyCharger, meta)
+                self.__load_device(name, ShellyCharger, meta, mqtt)
             elif driver_name == _SHELLY_HEATER:
                 from ..drivers.shelly.shellyheater import ShellyHeater
                 gc_collect()
-                self.__load_device(name, ShellyHeater, meta)
+                self.__load_device(name, ShellyHeater, meta, mqtt)
             elif driver_name == _VICTRON_MPPT:
                 from ..drivers.victron.victronmppt import VictronMppt
                 gc_collect()
@@ -1,7 +1,7 @@
 from asyncio import create_task
 from ..core.backendmqtt import Mqtt
 from ..core.logging import CustomLogger
-from ..core.types import CommandFiFo, MODE_CHARGE, MODE_DISCHARGE, MODE_IDLE, MODE_PROTECT, to_operation_mode, TYPE_CHARGER, TYPE_INVERTER, TYPE_SOLAR
+from ..core.types import CommandQueue, MODE_CHARGE, MODE_DISCHARGE, MODE_IDLE, MODE_PROTECT, to_operation_mode, TYPE_CHARGER, TYPE_INVERTER, TYPE_SOLAR
 from .classes.inverter import Inverter
 from .classes.charger import Charger
 from .classes.solar import Solar
@@ -10,7 +10,10 @@ class ModeSwitcher:
     def __init__(self, config: dict, mqtt: Mqtt, inverter: Inverter, charger: Charger, solar: Solar):
         from ..core.singletons import Singletons
         #config = config['modeswitcher']
-        self.__commands = CommandFiFo(16)
+        self.__commands = CommandQueue()
+        # commands are bound once, the queue compares them by identity
+        self.__update_command = self.__update
+        self.__try_set_mode_command = self.__try_set_mode
         self.__task = None
 
         self.__log: CustomLogger = Singletons.log.create_logger('modeswitcher')
@@ -41,8 +44,11 @@ class ModeSwitcher:
             await self.__commands.wait_and_clear()
             #await asyncio.sleep(0.1)
             try:
-                while self.__commands:
+                while len(self.__commands) > 0:
                     await self.__commands.popleft()()
+                if self.__commands.dropped > 0:
+                    self.__log.error('Dropped ', self.__commands.dropped, ' commands')
+                    self.__commands.dropped = 0
             except Exception as e:
                 self.__log.error('Cycle failed: ', e)
                 self.__log.trace(e)
@@ -55,7 +61,7 @@ class ModeSwitcher:
         self.__ui.switch_charger_locked(TYPE_CHARGER in self.__locked_devices)
         self.__ui.switch_inverter_locked(TYPE_INVERTER in self.__locked_devices)
         self.__ui.switch_solar_locked(TYPE_SOLAR in self.__locked_devices)
-        self.__commands.append(self.__update)
+        self.__commands.append_priority(self.__update_command)
 
     async def __try_set_mode(self):
         self.__displayed_mode = None # force sending the mode over MQTT even if nothing changes
@@ -110,4 +116,4 @@ class ModeSwitcher:
 
     def __on_mode(self, mode):
         self.__requested_mode = mode
-        self.__commands.append(self.__try_set_mode)
+        self.__commands.append_priority(self.__try_set_mode_command)
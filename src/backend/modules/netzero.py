@@ -1,17 +1,24 @@
 from micropython import const
-from collections import deque
 from time import time
+from ..helpers.slidingwindow import SlidingWindow
 
 _MAX_EVALUATION_TIME = const(120)
 _MIN_ITEMS = const(5)
 
+_STATISTIC_SECOND_SMALLEST = const('second_smallest')
+_STATISTIC_PERCENTILE = const('percentile')
+_STATISTIC_TRIMMED_MEAN = const('trimmed_mean')
+
+_MODE_STEPPED = const('stepped')
+_MODE_REGULATOR = const('regulator')
+
 class NetZero:
     def __init__(self, config):
         from ..core.singletons import Singletons
         self.__log = Singletons.log.create_logger('netzero')
         
         self.__time_span = min(_MAX_EVALUATION_TIME, int(config['evaluated_time_span']))
-        self.__data = deque(tuple(), _MAX_EVALUATION_TIME)
+        self.__data = SlidingWindow(_MAX_EVALUATION_TIME)
         self.__last_data = 0
 
         self.__unsigned = not bool(config['signed'])
@@ -21,58 +28,119 @@ class NetZero:
         self.__step_down = -int(config['change_downwards'])
         self.__mature_interval = int(config['maturity_time_span'])
 
+        self.__statistic = self.__create_statistic(config)
+
+        # regulator mode: the window holds the household load (consumption + inverter power),
+        # which stays valid across inverter power changes and is used as feed-forward
+        mode = config.get('mode', _MODE_STEPPED)
+        if mode not in (_MODE_STEPPED, _MODE_REGULATOR):
+            self.__log.error('Unknown mode: ', mode, ', using ', _MODE_STEPPED)
+        self.__regulator = (mode == _MODE_REGULATOR)
+        self.__kp = float(config.get('kp', 1.0))
+        self.__ki = float(config.get('ki', 0.0))
+        self.__integral = 0.0
+        self.__last_evaluation = None
+        self.__last_change = 0
+        self.__pending = 0
+        self.__overproduction = False
+
     def clear(self):
-        while self.__data:
-            self.__data.popleft()
+        self.__data.clear()
         self.__last_data = time()
+        self.__integral = 0.0
+        self.__last_evaluation = None
+        self.__last_change = self.__last_data
+
+    def on_power_change(self):
+        if self.__regulator:
+            self.__last_change = time()
+        else:
+            self.clear()
 
-    def update(self, timestamp, consumption):
+    def update(self, timestamp, consumption, inverter_power):
         if timestamp < self.__last_data:
             self.__log.info('Omitting data consumption data, too old.')
             return
 
-        if self.__last_data == timestamp and self.__data:
+        if self.__last_data == timestamp and len(self.__data) > 0:
             self.__log.info('More than one data point for timestamp, dropping the newer one.')
         else:
-            self.__data.append((timestamp, consumption))
+            self.__data.append(timestamp, consumption + inverter_power if self.__regulator else consumption)
+            self.__overproduction = self.__unsigned and consumption == 0
 
-        while True:
-            item = self.__data.popleft()
-            if item[0] + self.__time_span > timestamp:
-                self.__data.appendleft(item) # deque has no peek yet, so just put it back into the deque
-                break
+        self.__data.trim(timestamp - self.__time_span)
 
         self.__last_data = timestamp
 
-    def evaluate(self):
-        now = time()
-        smallest = None
-        second_smallest = None
-        oldest_age = 0
-
-        for item in self.__data:
-            consumption = item[1]
-            timestamp = item[0]
-            
-            oldest_age = max(oldest_age, now - timestamp)
-            if smallest is None or consumption < smallest:
-                second_smallest = smallest
-                smallest = consumption
-            elif second_smallest is None or consumption < second_smallest:
-                second_smallest = consumption
-
-        if second_smallest is None: # not enough data point to do any evaluation
+    def evaluate(self, power):
+        if self.__regulator:
+            return self.__evaluate_regulator(power)
+
+        oldest = self.__data.oldest_timestamp
+        oldest_age = 0 if oldest is None else time() - oldest
+        # all statistics need at least two data points, like the second smallest value always did
+        value = self.__statistic() if len(self.__data) >= 2 else None
+
+        if value is None: # not enough data point to do any evaluation
             result = 0
-        elif self.__unsigned and second_smallest == 0: # overproduction
+        elif self.__unsigned and value == 0: # overproduction
             result = self.__step_down
-        elif second_smallest < (self.__target - self.__hysteresis): # reduce
-            result = max(self.__step_down, second_smallest - self.__target)
+        elif value < (self.__target - self.__hysteresis): # reduce
+            result = max(self.__step_down, value - self.__target)
         elif len(self.__data) < _MIN_ITEMS or oldest_age < self.__mature_interval: # wait
             result = 0
-        elif second_smallest > (self.__target + self.__hysteresis): # increase
-            result = min(self.__step_up, second_smallest - self.__target) 
+        elif value > (self.__target + self.__hysteresis): # increase
+            result = min(self.__step_up, value - self.__target) 
         else:
             result = 0
 
-        self.__log.info('Delta: ', result, ' W | Min: ', second_smallest, ' W | ', len(self.__data), ' / ', _MIN_ITEMS, ' data points | ', oldest_age, ' / ', self.__mature_interval, ' s time span')
+        self.__log.info('Delta: ', result, ' W | Min: ', value, ' W | ', len(self.__data), ' / ', _MIN_ITEMS, ' data points | ', oldest_age, ' / ', self.__mature_interval, ' s time span')
         return result
+
+    def __evaluate_regulator(self, power):
+        now = time()
+        load = self.__statistic() if len(self.__data) >= 2 else None
+        settling_time = now - self.__last_change
+
+        if load is None: # not enough data point to do any evaluation
+            error = 0
+            result = 0
+        else:
+            error = load - power - self.__target # expected consumption at current inverter power
+            if self.__last_evaluation is not None:
+                self.__integral += error * (now - self.__last_evaluation)
+            self.__last_evaluation = now
+            # anti windup: the integral term alone must never exceed a single power change
+            if self.__ki != 0:
+                self.__integral = max(self.__step_down / self.__ki, min(self.__step_up / self.__ki, self.__integral))
+            result = round(self.__kp * error + self.__ki * self.__integral)
+
+            settling = settling_time < self.__mature_interval
+            if self.__overproduction: # overproduction, load is unknown
+                result = self.__step_down
+            elif abs(error) <= self.__hysteresis:
+                result = 0
+            elif result > 0 and (len(self.__data) < _MIN_ITEMS or settling): # wait
+                result = 0
+            if settling and result < 0 and power + result >= self.__pending - self.__hysteresis: # previous command not applied yet
+                result = 0
+            result = max(self.__step_down, min(self.__step_up, result))
+
+            if result != 0:
+                self.__pending = power + result
+                self.__last_change = now
+
+        self.__log.info('Delta: ', result, ' W | Load: ', load, ' W | Error: ', error, ' W | ', len(self.__data), ' / ', _MIN_ITEMS, ' data points | ', settling_time, ' / ', self.__mature_interval, ' s since change')
+        return result
+
+    def __create_statistic(self, config):
+        statistic = config.get('statistic', _STATISTIC_SECOND_SMALLEST)
+        if statistic == _STATISTIC_PERCENTILE:
+            percent = int(config['percentile'])
+            return lambda: self.__data.percentile(percent)
+        elif statistic == _STATISTIC_TRIMMED_MEAN:
+            percent = int(config['trim'])
+            return lambda: self.__data.trimmed_mean(percent)
+        elif statistic != _STATISTIC_SECOND_SMALLEST:
+            self.__log.error('Unknown statistic: ', statistic, ', using ', _STATISTIC_SECOND_SMALLEST)
+        return lambda: self.__data.nth_smallest(1)
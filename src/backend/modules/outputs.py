@@ -1,7 +1,7 @@
 from asyncio import create_task
 from ..core.backendmqtt import Mqtt
 from ..core.logging import CustomLogger
-from ..core.types import CommandFiFo, STATUS_ON, MEASUREMENT_CAPACITY, MEASUREMENT_CURRENT, MEASUREMENT_POWER, MEASUREMENT_STATUS
+from ..core.types import LanedFiFo, STATUS_ON, MEASUREMENT_CAPACITY, MEASUREMENT_CURRENT, MEASUREMENT_POWER, MEASUREMENT_STATUS
 from ..core.types import TYPE_CHARGER, TYPE_HEATER, TYPE_INVERTER, TYPE_SOLAR
 from .supervisor import Supervisor
 from .consumption import Consumption
@@ -16,7 +16,7 @@ class Outputs:
     def __init__(self, mqtt: Mqtt, supervisor: Supervisor, devices: Devices, consumption: Consumption, \
                  battery: Battery, charger: Charger, heater: Heater, inverter: Inverter, solar: Solar):
         from ..core.singletons import Singletons
-        self.__commands = CommandFiFo(32 + (8 * len(devices.devices)))
+        self.__commands = LanedFiFo(32, 8 * len(devices.devices) + 8)
         self.__log: CustomLogger = Singletons.log.create_logger('output')
         self.__mqtt = mqtt
         self.__supervisor = supervisor
@@ -49,100 +49,98 @@ class Outputs:
 
         self.__consumption.on_power.append(self.__on_consumption_power)
 
+        Singletons.ble.on_statistics_data.append(self.__on_bluetooth_statistics)
+
         self.__task = create_task(self.__run())
 
     async def __run(self):
         while True:
             try:
                 await self.__commands.wait_and_clear()
-                while self.__commands:
-                    await self.__commands.popleft()()
+                while len(self.__commands) > 0:
+                    handler, first, second = self.__commands.popleft()
+                    await handler(first, second)
+                if self.__commands.dropped > 0:
+                    self.__log.error('Dropped ', self.__commands.dropped, ' device data updates')
+                    self.__commands.dropped = 0
+                if self.__commands.dropped_control > 0:
+                    self.__log.error('Dropped ', self.__commands.dropped_control, ' summary updates')
+                    self.__commands.dropped_control = 0
             except Exception as e:
                 self.__log.error('Cycle failed: ', e)
                 self.__log.trace(e)
 
 # charger
 
-    async def __send_charger_summary_data(self):
-        data = self.__commands.popleft()
+    async def __send_charger_summary_data(self, data, _):
         if MEASUREMENT_STATUS in data:
             self.__ui.switch_charger_on(data[MEASUREMENT_STATUS] == STATUS_ON)
         await self.__mqtt.send_charger_summary(data)
 
-    async def __send_charger_device_data(self):
-        name = self.__commands.popleft()
-        data = self.__commands.popleft()
+    async def __send_charger_device_data(self, name, data):
         await self.__mqtt.send_charger_device(name, data)
 
 # heater
 
-    async def __send_heater_summary_data(self):
-        data = self.__commands.popleft()
+    async def __send_heater_summary_data(self, data, _):
         await self.__mqtt.send_heater_summary(data)
 
-    async def __send_heater_device_data(self):
-        name = self.__commands.popleft()
-        data = self.__commands.popleft()
+    async def __send_heater_device_data(self, name, data):
         await self.__mqtt.send_heater_device(name, data)
 
 # inverter
 
-    async def __send_inverter_summary_data(self):
-        data = self.__commands.popleft()
+    async def __send_inverter_summary_data(self, data, _):
         if MEASUREMENT_STATUS in data:
             self.__ui.switch_inverter_on(data[MEASUREMENT_STATUS] == STATUS_ON)
         if MEASUREMENT_POWER in data:
             self.__ui.update_inverter_power(data[MEASUREMENT_POWER])
         await self.__mqtt.send_inverter_summary(data)
 
-    async def __send_inverter_device_data(self):
-        name = self.__commands.popleft()
-        data = self.__commands.popleft()
+    async def __send_inverter_device_data(self, name, data):
         await self.__mqtt.send_inverter_device(name, data)
 
 # solar
 
-    async def __send_solar_summary_data(self):
-        data = self.__commands.popleft()
+    async def __send_solar_summary_data(self, data, _):
         if MEASUREMENT_STATUS in data:
             self.__ui.switch_solar_on(data[MEASUREMENT_STATUS] == STATUS_ON)
         if MEASUREMENT_POWER in data:
             self.__ui.update_solar_power(data[MEASUREMENT_POWER])
         await self.__mqtt.send_solar_summary(data)
 
-    async def __send_solar_device_data(self):
-        name = self.__commands.popleft()
-        data = self.__commands.popleft()
+    async def __send_solar_device_data(self, name, data):
         await self.__mqtt.send_solar_device(name, data)
 
 # battery
 
-    async def __send_battery_summary(self):
-        capacity = self.__commands.popleft()
-        current = self.__commands.popleft()
+    async def __send_battery_summary(self, capacity, current):
         data = {
             MEASUREMENT_CAPACITY: float(capacity),
             MEASUREMENT_CURRENT: float(current)
         }
         await self.__mqtt.send_battery_summary(data)
 
-    async def __send_battery_device(self):
-        name = self.__commands.popleft()
+    async def __send_battery_device(self, name, _):
         changed_battery = self.__battery.battery_data[name]
         if changed_battery is not None and changed_battery.valid and not changed_battery.is_forwarded:
             await self.__mqtt.send_battery_device(changed_battery)
 
 #consumption
 
-    async def __send_consumption_power(self):
-        power = self.__commands.popleft()
+    async def __send_consumption_power(self, power, _):
         self.__ui.update_consumption(power)
         data = {MEASUREMENT_POWER: int(power)}
         await self.__mqtt.send_sensor_device('grid', data)
 
+# bluetooth
+
+    async def __send_bluetooth_statistics(self, data, _):
+        await self.__mqtt.send_bluetooth_statistics(data)
+
 # other
 
-    async def __send_all_summary(self):
+    async def __send_all_summary(self, *_):
         await self.__mqtt.send_heater_summary(self.__heater.get_summary_data())
         await self.__mqtt.send_inverter_summary(self.__inverter.get_summary_data())
         await self.__mqtt.send_solar_summary(self.__solar.get_summary_data())
@@ -151,47 +149,34 @@ class Outputs:
 # callback handlers
 
     def __on_mqtt_connect(self):
-        self.__commands.append(self.__send_all_summary)
+        self.__commands.append_control(self.__send_all_summary)
 
     def __on_charger_summary_data(self, data):
-        self.__commands.append(self.__send_charger_summary_data)
-        self.__commands.append(data)
+        self.__commands.append_control(self.__send_charger_summary_data, data)
 
     def __on_heater_summary_data(self, data):
-        self.__commands.append(self.__send_heater_summary_data)
-        self.__commands.append(data)
+        self.__commands.append_control(self.__send_heater_summary_data, data)
 
     def __on_inverter_summary_data(self, data):
-        self.__commands.append(self.__send_inverter_summary_data)
-        self.__commands.append(data)
+        self.__commands.append_control(self.__send_inverter_summary_data, data)
 
     def __on_solar_summary_data(self, data):
-        self.__commands.append(self.__send_solar_summary_data)
-        self.__commands.append(data)
+        self.__commands.append_control(self.__send_solar_summary_data, data)
 
     def __on_charger_device_data(self, sender, data):
-        self.__commands.append(self.__send_charger_device_data)
-        self.__commands.append(sender.name)
-        self.__commands.append(data)
+        self.__commands.append_telemetry(self.__send_charger_device_data, sender.name, data)
 
     def __on_heater_device_data(self, sender, data):
-        self.__commands.append(self.__send_heater_device_data)
-        self.__commands.append(sender.name)
-        self.__commands.append(data)
+        self.__commands.append_telemetry(self.__send_heater_device_data, sender.name, data)
 
     def __on_inverter_device_data(self, sender, data):
-        self.__commands.append(self.__send_inverter_device_data)
-        self.__commands.append(sender.name)
-        self.__commands.append(data)
+        self.__commands.append_telemetry(self.__send_inverter_device_data, sender.name, data)
 
     def __on_solar_device_data(self, sender, data):
-        self.__commands.append(self.__send_solar_device_data)
-        self.__commands.append(sender.name)
-        self.__commands.append(data)
+        self.__commands.append_telemetry(self.__send_solar_device_data, sender.name, data)
 
     def __on_battery_data(self, name):
-        self.__commands.append(self.__send_battery_device)
-        self.__commands.append(name)
+        self.__commands.append_telemetry(self.__send_battery_device, name)
 
         total_current = 0
         total_capacity = 0
@@ -202,10 +187,11 @@ class Outputs:
             total_capacity += battery.c
         else:
             self.__ui.update_battery_capacity(total_capacity)
-            self.__commands.append(self.__send_battery_summary)
-            self.__commands.append(total_capacity)
-            self.__commands.append(total_current)
+            # sent with every battery read like the battery dev messages, so it is telemetry as well
+            self.__commands.append_telemetry(self.__send_battery_summary, total_capacity, total_current)
 
     def __on_consumption_power(self, power):
-        self.__commands.append(self.__send_consumption_power)
-        self.__commands.append(power)
+        self.__commands.append_telemetry(self.__send_consumption_power, power)
+
+    def __on_bluetooth_statistics(self, data):
+        self.__commands.append_telemetry(self.__send_bluetooth_statistics, data)
\ No newline at end of file